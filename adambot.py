@@ -2,6 +2,7 @@ import datetime
 import json
 import os
 import time
+from collections import OrderedDict
 from typing import Callable, Optional
 
 import asyncpg
@@ -16,6 +17,7 @@ from tzlocal import get_localzone
 
 import libs.db.database_handle as database_handle  # not strictly a lib rn but hopefully will be in the future
 import libs.misc.utils as utils
+from libs.misc.log_buffer import LogBuffer
 from libs.misc.decorators import MissingStaffError, MissingDevError, MissingStaffSlashError, MissingDevSlashError
 from libs.misc.utils import DefaultEmbedResponses, ContextTypes, get_context_type
 from scripts.utils import cog_handler
@@ -119,7 +121,12 @@ class AdamBot(Bot):
         self.ts_format = "%A %d/%m/%Y %H:%M:%S"
         self.start_time = start_time
         self._init_time = time.time()
-        self.last_active = {}  # Used for ensuring bots do not respond or invoke commands
+        self.last_active = {}  # Links guild_id -> OrderedDict of the ids of its most recently active members, most recent last
+        self.last_active_size = self.internal_config.get("last_active_size", 100)  # Most members remembered per guild
+        self.shutdown_hooks = []  # Coroutine functions awaited on shutdown before the DB pool closes, e.g. to flush write buffers
+        self.log_buffer = LogBuffer(self)  # Packs log embeds bound for the same channel into shared messages
+        self.shutdown_hooks.append(self.log_buffer.flush_all)
+        self.member_guilds = {}  # Links user_id -> ids of the guilds the bot shares with them
 
         print(f"BOT INITIALISED {self._init_time - start_time} seconds")
 
@@ -142,6 +149,11 @@ class AdamBot(Bot):
         print(p_s)
 
         if hasattr(self, "pool"):
+            for hook in self.shutdown_hooks:
+                try:
+                    await hook()
+                except Exception as e:
+                    print(f"{type(e).__name__}: {e}")
             self.pool.terminate()  # TODO: Make this more graceful
 
         c_s = "Closing connection to Discord..."
@@ -213,10 +225,11 @@ class AdamBot(Bot):
 
         self.internal_config = []
         self.pool: \
-            asyncpg.pool.Pool = await asyncpg.create_pool(self.db_url + "?sslmode=require", max_size=self.connections)
+            asyncpg.pool.Pool = await asyncpg.create_pool(self.db_url + "?sslmode=require", max_size=self.connections,
+                                                          init=database_handle.init_connection)
 
-        await database_handle.introduce_tables(self.pool, self.cog_handler.db_tables)
-        await database_handle.insert_cog_db_columns_if_not_exists(self.pool, self.cog_handler.db_tables)
+        await database_handle.migrate(self.pool, self.cog_handler.db_tables, self.cog_handler.db_migrations,
+                                      self.cog_handler.db_indexes, list(self.cog_handler.cog_list))
         print(f"DB took {time.time() - self.db_start} seconds to connect to")
 
         try:
@@ -231,6 +244,8 @@ class AdamBot(Bot):
         """
         self.login_time = time.time()
         print(f"Bot logged into Discord ({self.login_time - self.start_time} seconds total)")
+        for guild in self.guilds:  # Members are chunked by now
+            self.index_guild_members(guild)
         await self.tree.sync()
         await self.change_presence(activity=discord.Game(name=f"in {len(self.guilds)} servers | Type `help` for help"),
                                    status=discord.Status.online)
@@ -243,16 +258,52 @@ class AdamBot(Bot):
 
         if type(message.channel) == discord.DMChannel or message.author.bot:
             return
-        if message.guild.id not in self.last_active:
-            self.last_active[message.guild.id] = []  # create the dict key for that guild if it doesn't exist
-        last_active_list = self.last_active[message.guild.id]
-        if message.author in last_active_list:
-            last_active_list.remove(message.author)
-        last_active_list.insert(0, message.author)
+        last_active = self.last_active.setdefault(message.guild.id, OrderedDict())
+        last_active[message.author.id] = None
+        last_active.move_to_end(message.author.id)
+        if len(last_active) > self.last_active_size:
+            last_active.popitem(last=False)
 
         # Now run commands, due to overriding of default bot `on_message` doesn't do this automatically
         await self.process_commands(message)
 
+    def index_guild_members(self, guild: discord.Guild) -> None:
+        for member in guild.members:
+            self.member_guilds.setdefault(member.id, set()).add(guild.id)
+
+    def unindex_member(self, user_id: int, guild_id: int) -> None:
+        guild_ids = self.member_guilds.get(user_id)
+        if guild_ids is None:
+            return
+
+        guild_ids.discard(guild_id)
+        if not guild_ids:
+            del self.member_guilds[user_id]
+
+    def get_mutual_guilds(self, user_id: int) -> list[discord.Guild]:
+        """
+        Returns the guilds the bot shares with the user, found from `member_guilds` rather than searching every guild's
+        members
+        """
+
+        return [guild for guild in map(self.get_guild, self.member_guilds.get(user_id, ())) if guild]
+
+    async def on_guild_join(self, guild: discord.Guild) -> None:
+        self.index_guild_members(guild)
+
+    async def on_guild_available(self, guild: discord.Guild) -> None:
+        self.index_guild_members(guild)
+
+    async def on_guild_remove(self, guild: discord.Guild) -> None:
+        for member in guild.members:
+            self.unindex_member(member.id, guild.id)
+
+    async def on_member_join(self, member: discord.Member) -> None:
+        self.member_guilds.setdefault(member.id, set()).add(member.guild.id)
+
+    async def on_raw_member_remove(self, payload: discord.RawMemberRemoveEvent) -> None:
+        self.unindex_member(payload.user.id, payload.guild_id)
+
     async def on_command_error(self, ctx: commands.Context, error) -> None:
         print(error)  # added back for the sake of retaining sanity when debugging
         if isinstance(error, MissingStaffError) or isinstance(error, MissingDevError):
@@ -1,10 +1,11 @@
 # REQUIRES D.PY V2
 
-import ast
+import ast  # only needed for actions stored before the JSONB column
 import asyncio
-import copy
 import inspect
-from typing import Callable, Any
+import json
+from types import MappingProxyType
+from typing import Callable, Any, NamedTuple, Optional
 
 import asyncpg
 import discord
@@ -49,6 +50,29 @@ class NoSendContext(commands.Context):
             return
 
 
+class CommandPlan(NamedTuple):
+    """
+    One command of an action, with everything that doesn't depend on the invocation worked out when the action is
+    registered
+    """
+
+    name: str
+    command_obj: commands.Command
+    params: tuple[inspect.Parameter, ...]  # The params that get bound, up to and including any *args or `*, args` param
+    var_arg_pos: Optional[int]  # Position of the *args param, if there is one
+    consume_rest: frozenset[str]  # Keyword-only params without a default, i.e. `*, args`, which take the rest of the input
+    reply_args: frozenset[int]
+    defaults: MappingProxyType  # Links position -> default value
+    reuse: MappingProxyType  # Links position -> (command index, arg index) of the value to reuse
+    silent: bool
+    outputs: tuple[dict, ...]
+
+
+class ActionPlan(NamedTuple):
+    commands: tuple[CommandPlan, ...]
+    silent: bool  # Whether any of the commands need a NoSendContext
+
+
 class Checks:  # could also be possible to tidy the wait_for's up if they can be put in a method?
     """
     Class that houses the checks used in "wait_for" calls
@@ -115,11 +139,41 @@ class Actions(commands.Cog):
     def __init__(self, bot: AdamBot) -> None:
         self.bot = bot
         self.actions = {}
+        self.plans = {}  # Links guild_id -> {action name: ActionPlan}
+
+    async def migrate_legacy_actions(self) -> None:
+        """
+        One-time migration of the action column from the repr of a dict stored as TEXT to JSONB
+
+        Actions that can't be converted to JSON keep their legacy repr, stored as a JSON string, and are read the old
+        way when they're loaded
+        """
+
+        async with self.bot.pool.acquire() as connection:
+            data_type = await connection.fetchval(
+                "SELECT data_type FROM information_schema.columns WHERE table_schema = current_schema() AND table_name = 'actions' AND column_name = 'action'")
+            if data_type != "text":
+                return  # already migrated
+
+            actions = []
+            legacy_ids = []
+            for record in await connection.fetch("SELECT id, action FROM actions WHERE action IS NOT NULL"):
+                try:
+                    actions.append((record["id"], json.dumps(ast.literal_eval(record["action"]))))
+                except (ValueError, SyntaxError, TypeError) as e:
+                    print(f"{type(e).__name__}: {e}\nThe above occurred when converting action {record['id']} to JSON, keeping it as it is")
+                    legacy_ids.append(record["id"])
+
+            async with connection.transaction():
+                await connection.executemany("UPDATE actions SET action = $2 WHERE id = $1", actions)
+                await connection.execute(
+                    f"ALTER TABLE actions ALTER COLUMN action TYPE JSONB USING CASE WHEN id = ANY('{{{', '.join(map(str, legacy_ids))}}}'::int[]) THEN to_jsonb(action) ELSE action::jsonb END")
+            print(f"Migrated {len(actions)} actions to JSONB, {len(legacy_ids)} kept in their legacy form")
 
     async def load_actions(self) -> None:
         """
         Method for loading actions
-        Fetches the actions from the db and uses ast to evaluate them and add them to self.actions
+        Fetches the actions from the db and adds them to self.actions
         """
 
         success = False
@@ -127,15 +181,23 @@ class Actions(commands.Cog):
         while not success:
             success = True
             try:
+                await self.migrate_legacy_actions()
                 async with self.bot.pool.acquire() as connection:
                     for guild in self.bot.guilds:
                         actions = await connection.fetch("SELECT * FROM actions WHERE guild_id = ($1)", guild.id)
                         self.actions[guild.id] = {}
                         for action in actions:
                             action = dict(action)
+                            if not action["action"]:
+                                continue
+                            if type(action["action"]) is str:  # legacy action that couldn't be stored as JSON
+                                try:
+                                    action["action"] = ast.literal_eval(action["action"])
+                                except (ValueError, SyntaxError) as e:
+                                    print(f"{type(e).__name__}: {e}\nThe above occurred when loading action {action['id']}, skipping it")
+                                    continue
 
-                            await self.register_action(guild.id, action["action_name"],
-                                                       ast.literal_eval(action["action"]))
+                            await self.register_action(guild.id, action["action_name"], action["action"])
 
             except asyncpg.exceptions.UndefinedTableError:
                 print("Actions table doesn't exist yet, waiting 1 second")
@@ -256,6 +318,11 @@ class Actions(commands.Cog):
 
         self.bot.all_commands["base_action_handler"].aliases.append(name)
         self.actions[guild_id][name] = action
+        plan = self.compile_action(action)
+        if plan:
+            self.plans.setdefault(guild_id, {})[name] = plan
+        else:
+            self.plans.get(guild_id, {}).pop(name, None)  # Commands it needs aren't loaded, try again when it's used
         self.bot.remove_command(
             "base_action_handler")  # behaviour has changed so sticking to documented methods for now
         self.bot.add_command(self.base_action_handler)
@@ -268,7 +335,7 @@ class Actions(commands.Cog):
         async with self.bot.pool.acquire() as connection:
             try:
                 await connection.execute("INSERT INTO actions (guild_id, action_name, action) values ($1, $2, $3)",
-                                         ctx.guild.id, str(name), str(action))
+                                         ctx.guild.id, str(name), action)
             except Exception as e:
                 raise e
             await self.register_action(ctx.guild.id, name, action)
@@ -290,9 +357,68 @@ class Actions(commands.Cog):
             except Exception as e:
                 raise e
         del self.actions[guild_id][name]
+        self.plans.get(guild_id, {}).pop(name, None)
         del self.bot.all_commands[name]
         del self.base_action_handler.aliases[self.base_action_handler.aliases.index(name)]
 
+    def compile_action(self, action: dict) -> Optional[ActionPlan]:
+        """
+        Works out everything about running an action that doesn't change between invocations: the command objects,
+        which params get bound and where the *args and `*, args` params are.
+
+        Returns None if any of the action's commands don't exist.
+        """
+
+        command_plans = []
+        for command in action.get("commands", []):
+            command_obj = self.bot.get_command(command["command"])
+            if not command_obj:
+                return None
+
+            arg_list = list(command_obj.clean_params)
+            argspec = inspect.getfullargspec(command_obj.callback)
+            kwonlydefaults = argspec.kwonlydefaults or {}
+            consume_rest = frozenset(arg for arg in argspec.kwonlyargs if arg not in kwonlydefaults)
+
+            var_arg_pos = None
+            bound_args = arg_list
+            for z, arg in enumerate(arg_list):
+                if arg == argspec.varargs or arg in consume_rest:  # Nothing after these can be given positionally
+                    var_arg_pos = z if arg == argspec.varargs else None
+                    bound_args = arg_list[:z + 1]
+                    break
+
+            command_plans.append(CommandPlan(
+                name=command["command"],
+                command_obj=command_obj,
+                params=tuple(command_obj.clean_params[arg] for arg in bound_args),
+                var_arg_pos=var_arg_pos,
+                consume_rest=consume_rest,
+                reply_args=frozenset(command.get("reply_args", [])),
+                defaults=MappingProxyType({int(x): value for x, value in command.get("defaults", {}).items()}),
+                reuse=MappingProxyType({int(x): tuple(int(i) for i in y.split(",")) for x, y in
+                                        command.get("reuse", {}).items()}),
+                silent=command.get("silent", False),
+                outputs=tuple(command.get("outputs", []))
+            ))
+
+        return ActionPlan(commands=tuple(command_plans), silent=any(plan.silent for plan in command_plans))
+
+    def get_plan(self, guild_id: int, name: str) -> Optional[ActionPlan]:
+        """
+        Returns the compiled plan for an action, compiling it again if any of its commands have been removed or
+        reloaded since it was compiled
+        """
+
+        plan = self.plans.get(guild_id, {}).get(name, None)
+        if plan and all(self.bot.get_command(command.name) is command.command_obj for command in plan.commands):
+            return plan
+
+        plan = self.compile_action(self.actions[guild_id][name])
+        if plan:
+            self.plans.setdefault(guild_id, {})[name] = plan
+        return plan
+
     @commands.command(hidden=True)  # Hidden to prevent people accessing
     async def base_action_handler(self, ctx: commands.Context, *args) -> None:
         """
@@ -309,7 +435,7 @@ class Actions(commands.Cog):
         This method also has handling for other properties actions have
         This includes command outputs, command silencing etc
 
-        clean_params is made use of throughout the method, eliminating the need to check for "self" and "ctx"
+        Everything that doesn't depend on the arguments is in the action's ActionPlan, so all that happens here is binding
         """
 
         action = self.actions.get(ctx.guild.id, {}).get(ctx.invoked_with, None)
@@ -320,127 +446,85 @@ class Actions(commands.Cog):
             await self.bot.DefaultEmbedResponses.invalid_perms(self.bot, ctx)
             return
 
-        action = copy.deepcopy(action)
+        plan = self.get_plan(ctx.guild.id, ctx.invoked_with)
+        if not plan:
+            await ctx.send(embed=Embed(title=":x: This action can't be used right now!",
+                                       description="One of the commands it uses no longer exists",
+                                       colour=self.bot.ERROR_RED))
+            return
+
         clean_ctx = await self.bot.get_context(ctx.message,
-                                               cls=NoSendContext)  # not entirely sure yet how to override ctx.message.channel without making all hell break loose
+                                               cls=NoSendContext) if plan.silent else None  # not entirely sure yet how to override ctx.message.channel without making all hell break loose
 
+        bound = []  # {"arg_values": ..., "var_args": ..., "all_arg_values": ...} for each command
+        ref = None
         arg_index = 0
-        for f, command in enumerate(action["commands"]):
-            command["command_obj"] = self.bot.get_command(command["command"])
-            command["arg_values"] = {}
-            command["var_args"] = []
-            command["all_arg_values"] = []
-
-            arg_list = list(command["command_obj"].clean_params)
-
-            argspec = inspect.getfullargspec(command["command_obj"].callback)
-            argspec = argspec._replace(
-                kwonlydefaults={}) if argspec.kwonlydefaults is None else argspec  # makes things simpler later on
-
-            var_arg = argspec.varargs
-
-            command["var_arg_pos"] = None
-            consume_pos = None
-
-            for z, arg in enumerate(command["command_obj"].clean_params):
-                command["var_arg_pos"] = z if arg == var_arg else command["var_arg_pos"]
-                consume_pos = z if arg in argspec.kwonlyargs and arg not in argspec.kwonlydefaults else consume_pos  # *, args type of argument
-
-                if command["var_arg_pos"] is not None or consume_pos is not None:
-                    break
-
-            clean_params = list(command["command_obj"].clean_params)[:command["var_arg_pos"] + 1] if command[
-                                                                                                         "var_arg_pos"] is not None else (
-                list(command["command_obj"].clean_params)[:consume_pos + 1] if consume_pos is not None else command[
-                    "command_obj"].clean_params)
-
-            for x, arg in enumerate(clean_params):
-                command["var_arg_pos"] = x if arg == var_arg else None
-
-                if x in command["reply_args"] and ctx.message.reference:
-                    ref = await ctx.fetch_message(ctx.message.reference.message_id)
-
-                    if arg != var_arg:
-                        command["arg_values"][arg_list[x]] = ref.author
-
-                    elif not command["var_args"] or f == len(action["commmands"]) - 1:
-                        command["var_args"].append(ref.author)
-
-                elif str(x) in command["defaults"]:
-                    if arg != var_arg:
-                        command["arg_values"][arg_list[x]] = command["defaults"][str(x)]
-
-                    elif not command["var_args"] or f == len(action["commands"]) - 1:
-                        command["var_args"].append(command["defaults"][str(x)])
-
-                elif str(x) in command["reuse"]:
-                    y = command["reuse"][str(x)]
-                    command_index = int(y[:y.index(",")])
-                    arg_index = int(y[y.index(",") + 1:])
-
-                    if arg_index == action["commands"][command_index]["var_arg_pos"]:
-                        needed_arg = action["commands"][command_index]["var_args"]
-
+        last = len(plan.commands) - 1
+        for f, command in enumerate(plan.commands):
+            arg_values = {}
+            var_args = []
+
+            def bind(value) -> None:
+                if x != command.var_arg_pos:
+                    arg_values[arg] = value
+                elif not var_args or f == last:
+                    var_args.append(value)
+
+            for x, param in enumerate(command.params):
+                arg = param.name
+
+                if x in command.reply_args and ctx.message.reference:
+                    if not ref:
+                        ref = await ctx.fetch_message(ctx.message.reference.message_id)
+                    bind(ref.author)
+
+                elif x in command.defaults:
+                    bind(command.defaults[x])
+
+                elif x in command.reuse:
+                    command_index, reuse_index = command.reuse[x]
+                    if reuse_index == plan.commands[command_index].var_arg_pos:
+                        bind(bound[command_index]["var_args"])
                     else:
-                        arg_indexes = list(action["commands"][command_index]["arg_values"])
-                        needed_arg = action["commands"][command_index]["arg_values"][arg_indexes[arg_index]]
-
-                    if arg != var_arg:
-                        command["arg_values"][arg_list[x]] = needed_arg
-
-                    elif not command["var_args"] or f == len(action["commands"]) - 1:
-                        command["var_args"].append(needed_arg)
+                        bind(list(bound[command_index]["arg_values"].values())[reuse_index])
 
                 elif arg_index < len(args):
-                    if arg in argspec.kwonlyargs and arg not in argspec.kwonlydefaults and f == len(
-                            action["commands"]) - 1 and arg_index != len(args) - 1:  # i.e. *, args type arg
-                        command["arg_values"][arg_list[x]] = " ".join(args[arg_index:])
+                    if arg in command.consume_rest and f == last and arg_index != len(args) - 1:  # i.e. *, args type arg
+                        arg_values[arg] = " ".join(args[arg_index:])
 
-                    elif arg != var_arg:
-                        command["arg_values"][arg_list[x]] = args[arg_index]
+                    elif x != command.var_arg_pos:
+                        arg_values[arg] = args[arg_index]
 
-                    elif not command["var_args"] or f == len(action["commands"]) - 1:
-                        command["var_args"].append(args[arg_index])
-                        if f == len(action["commands"]) - 1:
-                            [command["var_args"].append(args[w]) for w in range(arg_index + 1, len(args))]
+                    elif not var_args or f == last:
+                        var_args.append(args[arg_index])
+                        if f == last:
+                            var_args += args[arg_index + 1:]
 
                     arg_index += 1
 
                 else:
                     await ctx.send(embed=Embed(title=":x: Missing argument!",
-                                               description=f"{command['command']} is missing a value for {arg} ({self.bot.ordinal(f + 1)} command)",
+                                               description=f"{command.name} is missing a value for {arg} ({self.bot.ordinal(f + 1)} command)",
                                                colour=self.bot.ERROR_RED))
                     return
 
-                annotation = command["command_obj"].clean_params[
-                    list(command["command_obj"].clean_params)[x]].annotation
-
-                if annotation is not inspect._empty:
-                    if arg != var_arg and arg in command["arg_values"]:  # is there any point doing converters for *args? probs get passed as a tuple anyway
-                        # reply won't necessarily be in arg_values
-                        command["arg_values"][arg] = await commands.run_converters(ctx, annotation,
-                                                                                   str(command["arg_values"][arg]),
-                                                                                   command["command_obj"].clean_params[
-                                                                                       list(command[
-                                                                                                "command_obj"].clean_params)[
-                                                                                           x]])
-
-            sorted_parts = []
-            for part in command["var_args"]:
-                [sorted_parts.append(part_) for part_ in part.split(" ")]
-            command["var_args"] = sorted_parts
-
-            command["all_arg_values"] = list(command["arg_values"].values())
-            if command["var_arg_pos"] is not None:
-                command["all_arg_values"].insert(command["var_arg_pos"], command["var_args"])
-
-        for command_ in action["commands"]:
-            if command_["silent"]:
-                await clean_ctx.invoke(command_["command_obj"], *command_["var_args"], **command_["arg_values"])
+                if param.annotation is not inspect.Parameter.empty and x != command.var_arg_pos and arg in arg_values:  # is there any point doing converters for *args? probs get passed as a tuple anyway
+                    # reply won't necessarily be in arg_values
+                    arg_values[arg] = await commands.run_converters(ctx, param.annotation, str(arg_values[arg]), param)
+
+            var_args = [part_ for part in var_args for part_ in part.split(" ")]
+            all_arg_values = list(arg_values.values())
+            if command.var_arg_pos is not None:
+                all_arg_values.insert(command.var_arg_pos, var_args)
+            bound.append({"arg_values": arg_values, "var_args": var_args, "all_arg_values": all_arg_values})
+
+        for command_, values in zip(plan.commands, bound):
+            if command_.silent:
+                await clean_ctx.invoke(command_.command_obj, *values["var_args"], **values["arg_values"])
             else:
-                await ctx.invoke(command_["command_obj"], *command_["var_args"], **command_["arg_values"])
+                await ctx.invoke(command_.command_obj, *values["var_args"], **values["arg_values"])
 
-            for output in command_.get("outputs", []):
+            for output in command_.outputs:
                 if output["channel_id"] != 0:
                     try:
                         channel = self.bot.get_channel(output["channel_id"])
@@ -457,8 +541,8 @@ class Actions(commands.Cog):
                         split_part = part[1:][:-1].split(".")
                         if len(split_part) >= 2 and split_part[0].isdigit() and split_part[1].isdigit():
 
-                            if 0 < int(split_part[0]) <= len(action["commands"]):
-                                out_command = action["commands"][int(split_part[0]) - 1]
+                            if 0 < int(split_part[0]) <= len(bound):
+                                out_command = bound[int(split_part[0]) - 1]
 
                                 if 0 < int(split_part[1]) <= len(out_command["all_arg_values"]):
                                     command_arg = out_command["all_arg_values"][int(split_part[1]) - 1]
@@ -1,4 +1,6 @@
-﻿from datetime import datetime, timedelta
+﻿import asyncio
+from collections import Counter
+from datetime import datetime, timedelta
 
 import discord
 from discord import app_commands
@@ -15,6 +17,8 @@ class Demographics(commands.Cog):
     """
 
     demographics_slash = app_commands.Group(name="demographics", description="View the server demographics")
+    SAMPLE_WORKERS = 10  # samples taken at once
+    SAMPLE_BATCH_WINDOW = 0.5  # seconds to wait for more samples before writing a batch
 
     def __init__(self, bot: AdamBot) -> None:
         """
@@ -25,6 +29,12 @@ class Demographics(commands.Cog):
 
         self.bot = bot
         self.Handlers = demographics_handlers.DemographicsHandlers(bot, self)
+        self.bot.shutdown_hooks.append(self.Handlers.close_render_pool)
+        self.demographic_roles = {}  # Links demographic_role_id -> {"role_id": ..., "guild_id": ..., "sample_rate": ...}
+        self.role_counts = {}  # Links guild_id -> Counter of role_id -> members with that role, made on a guild's first sample
+        self.pending_samples = []  # (n, demographic_role_id) waiting to be written
+        self.samples_written = None  # Task that writes the pending samples
+        self.samples_full = asyncio.Event()  # Set once every worker's sample is in the pending batch
 
     @commands.Cog.listener()
     async def on_ready(self) -> None:
@@ -34,30 +44,99 @@ class Demographics(commands.Cog):
         Syncs the application commands here.
         """
 
+        while not self.bot.online:
+            await asyncio.sleep(1)  # Wait else DB won't be available
+
+        async with self.bot.pool.acquire() as connection:
+            records = await connection.fetch("SELECT id, role_id, guild_id, sample_rate FROM demographic_roles;")
+        self.demographic_roles = {record["id"]: dict(record) for record in records}
+
         await self.bot.tasks.register_task_type("demographic_sample", self.handle_demographic_sample,
-                                                needs_extra_columns={"demographic_role_id": "bigint"})
+                                                needs_extra_columns={"demographic_role_id": "bigint"},
+                                                concurrency=self.SAMPLE_WORKERS)  # lets samples that are due together be written together
 
-    async def handle_demographic_sample(self, data: dict) -> None:
+    @commands.Cog.listener()
+    async def on_member_join(self, member: discord.Member) -> None:
+        counts = self.role_counts.get(member.guild.id)
+        if counts is not None:
+            counts.update(role.id for role in member.roles)
+
+    @commands.Cog.listener()
+    async def on_member_remove(self, member: discord.Member) -> None:
+        counts = self.role_counts.get(member.guild.id)
+        if counts is not None:
+            counts.subtract(role.id for role in member.roles)
+
+    @commands.Cog.listener()
+    async def on_member_update(self, before: discord.Member, after: discord.Member) -> None:
+        counts = self.role_counts.get(after.guild.id)
+        if counts is not None and before.roles != after.roles:
+            before_roles = {role.id for role in before.roles}
+            after_roles = {role.id for role in after.roles}
+            counts.update(after_roles - before_roles)
+            counts.subtract(before_roles - after_roles)
+
+    def _get_role_counts(self, guild: discord.Guild) -> Counter:
         """
-        Method to handle taking a demographics sample
+        Returns how many members have each role in `guild`. Counted from the member cache once, then kept up to date
+        by the member listeners.
         """
 
-        async with self.bot.pool.acquire() as connection:
-            demographic_role_id = data["demographic_role_id"]
-            results = await connection.fetch(
-                "SELECT role_id, guild_id, sample_rate FROM demographic_roles WHERE id = $1", demographic_role_id)
+        if guild.id not in self.role_counts:
+            self.role_counts[guild.id] = Counter(role.id for member in guild.members for role in member.roles)
+        return self.role_counts[guild.id]
 
-            guild = self.bot.get_guild(results[0][1])
-            role_id = results[0][0]
-            sample_rate = results[0][2]
-            n = len([x for x in guild.members if role_id in [y.id for y in x.roles]])
+    async def _write_sample(self, n: int, demographic_role_id: int) -> None:
+        """
+        Queues a sample to be written. Samples queued within SAMPLE_BATCH_WINDOW of the first, e.g. from tasks that
+        came due at the same time, go into the DB in one insert.
+        """
+
+        self.pending_samples.append((n, demographic_role_id))
+        if not self.samples_written:
+            self.samples_full.clear()
+            self.samples_written = self.bot.loop.create_task(self._write_samples())
+        if len(self.pending_samples) >= self.SAMPLE_WORKERS:
+            self.samples_full.set()  # Every worker is waiting on this batch, so nothing else can join it
+        await asyncio.shield(self.samples_written)
+
+    async def _write_samples(self) -> None:
+        try:
+            await asyncio.wait_for(self.samples_full.wait(), timeout=self.SAMPLE_BATCH_WINDOW)
+        except asyncio.TimeoutError:
+            pass
+        samples, self.pending_samples = self.pending_samples, []
+        self.samples_written = None
+        async with self.bot.pool.acquire() as connection:
+            await connection.execute(
+                "INSERT INTO demographic_samples (n, role_reference) SELECT * FROM unnest($1::int[], $2::int[])",
+                [n for n, _ in samples], [demographic_role_id for _, demographic_role_id in samples])
 
-            await connection.execute("INSERT INTO demographic_samples (n, role_reference) VALUES ($1, $2)", n,
-                                     demographic_role_id)
+    async def handle_demographic_sample(self, data: dict) -> None:
+        """
+        Method to handle taking a demographics sample
+        """
 
-            if data["task_name"] == "demographic_sample":  # IF NOT A ONE OFF SAMPLE, PERFORM IT AGAIN
-                await self.bot.tasks.submit_task("demographic_sample", datetime.utcnow() + timedelta(days=sample_rate),
-                                                 extra_columns={"demographic_role_id": demographic_role_id})
+        demographic_role_id = data["demographic_role_id"]
+        demographic_role = self.demographic_roles.get(demographic_role_id)
+        if not demographic_role:
+            async with self.bot.pool.acquire() as connection:
+                record = await connection.fetchrow(
+                    "SELECT id, role_id, guild_id, sample_rate FROM demographic_roles WHERE id = $1", demographic_role_id)
+            if not record:
+                return  # Role has stopped being tracked
+            demographic_role = self.demographic_roles[demographic_role_id] = dict(record)
+
+        guild = self.bot.get_guild(demographic_role["guild_id"])
+        if not guild:
+            return  # Bot is no longer in the guild
+        n = self._get_role_counts(guild)[demographic_role["role_id"]]
+        await self._write_sample(n, demographic_role_id)
+
+        if data["task_name"] == "demographic_sample":  # IF NOT A ONE OFF SAMPLE, PERFORM IT AGAIN
+            await self.bot.tasks.submit_task("demographic_sample",
+                                             datetime.utcnow() + timedelta(days=demographic_role["sample_rate"]),
+                                             extra_columns={"demographic_role_id": demographic_role_id})
 
     async def _get_roles(self, guild: discord.Guild) -> list[int]:
         """
@@ -75,10 +154,11 @@ class Demographics(commands.Cog):
         """
 
         async with self.bot.pool.acquire() as connection:
-            await connection.execute(
-                "INSERT INTO demographic_roles (sample_rate, guild_id, role_id) VALUES ($1, $2, $3);", sample_rate,
-                role.guild.id, role.id)
-            demographic_role_id = await connection.fetchval("SELECT MAX(id) FROM demographic_roles;")
+            demographic_role_id = await connection.fetchval(
+                "INSERT INTO demographic_roles (sample_rate, guild_id, role_id) VALUES ($1, $2, $3) RETURNING id;",
+                sample_rate, role.guild.id, role.id)
+            self.demographic_roles[demographic_role_id] = {"id": demographic_role_id, "role_id": role.id,
+                                                           "guild_id": role.guild.id, "sample_rate": sample_rate}
 
             now = datetime.utcnow()
             midnight = datetime(now.year, now.month, now.day, 23, 59, 59)  # Midnight of the current day
@@ -105,6 +185,7 @@ class Demographics(commands.Cog):
             demographic_role_id = await connection.fetchval("SELECT id FROM demographic_roles WHERE role_id = $1;",
                                                             role.id)
             await connection.execute("DELETE FROM demographic_roles WHERE role_id = $1;", role.id)
+            self.demographic_roles.pop(demographic_role_id, None)
             await connection.execute("DELETE FROM tasks WHERE demographic_role_id = $1", demographic_role_id)
 
     @staticmethod
@@ -0,0 +1,30 @@
+from io import BytesIO
+
+import numpy as np
+from matplotlib.dates import DateFormatter
+from matplotlib.figure import Figure
+
+
+def render_chart(title: str, series: list[tuple[str, tuple[float, float, float], np.ndarray, np.ndarray]]) -> bytes:
+    """
+    Draws the demographics chart and returns it as a PNG. Each series is (role name, rgb colour scaled to 0-1, sample
+    times in seconds since the epoch, member counts).
+
+    This runs in a separate process, so it only uses what can be pickled and the pyplot-free Figure API.
+    """
+
+    fig = Figure()
+    ax = fig.subplots()
+    for name, colour, taken_at, n in series:
+        ax.plot(taken_at.astype("datetime64[s]"), n, linewidth=1, markersize=2, color=colour, label=name)
+
+    ax.set(xlabel="Time", ylabel="Frequency", title=title)
+    ax.grid()
+    ax.legend(loc="upper left")
+    ax.set_ylim(bottom=0)
+    ax.fmt_xdata = DateFormatter("% Y-% m-% d % H:% M:% S")
+    fig.autofmt_xdate()
+
+    buf = BytesIO()
+    fig.savefig(buf, format="png")
+    return buf.getvalue()
@@ -1,18 +1,23 @@
 import asyncio
+from concurrent.futures import ProcessPoolExecutor
 
 import discord
+import numpy as np
 from discord.ext import commands
-from matplotlib import pyplot as plt
-from matplotlib.dates import DateFormatter
 
 from adambot import AdamBot
+from .demographics_chart import render_chart
 
 
 class DemographicsHandlers:
+    MAX_CHART_POINTS = 500  # per role, longer histories are averaged down to this many points
+
     def __init__(self, bot: AdamBot, cog: commands.Cog) -> None:  # note that this should really be of type Demographics but circular dependency needs to be resolved first
         self.bot = bot
         self.cog = cog
         self.ContextTypes = self.bot.ContextTypes
+        self.render_pool = None  # Charts are drawn in another process so they don't block the event loop
+        self.charts = {}  # Links guild_id -> (cache key, PNG bytes) of the last chart drawn
 
     async def viewroles(self, ctx: commands.Context | discord.Interaction) -> None:
         """
@@ -292,27 +297,49 @@ class DemographicsHandlers:
         Shows the demographics chart for the tracked roles within a context guild.
         """
 
-        fig, ax = plt.subplots()
         async with self.bot.pool.acquire() as connection:
             role_data = await connection.fetch("SELECT role_id, id FROM demographic_roles WHERE guild_id = $1",
                                                ctx.guild.id)
+            roles = {record["id"]: ctx.guild.get_role(record["role_id"]) for record in role_data}
+            roles = {demographic_role_id: role for demographic_role_id, role in roles.items() if role}
+            latest = await connection.fetchval(
+                "SELECT MAX(taken_at) FROM demographic_samples WHERE role_reference = ANY($1)", list(roles))
+
+            title = f"{ctx.guild.name}'s  demographics ({ctx.guild.member_count} members)"
+            cache_key = (latest, title, tuple((role.id, role.name, role.color.value) for role in roles.values()))
+            cached = self.charts.get(ctx.guild.id)
+            if cached and cached[0] == cache_key:
+                await self.bot.send_image_file(ctx, cached[1], ctx.channel, "demographics-data")
+                return
 
-            for role in role_data:
-                data = await connection.fetch("SELECT taken_at, n FROM demographic_samples WHERE role_reference = $1",
-                                              role[1])
-                role = ctx.guild.get_role(role[0])
-                rgb_scaled_tuple = tuple(
-                    x / 255 for x in role.color.to_rgb())  # Scale 0-255 integers down to 0-1 floats
-
-                ax.plot([x[0] for x in data], [x[1] for x in data], linewidth=1, markersize=2, color=rgb_scaled_tuple,
-                        label=role.name)
-
-        ax.set(xlabel="Time", ylabel="Frequency",
-               title=f"{ctx.guild.name}'s  demographics ({ctx.guild.member_count} members)")
-        ax.grid()
-        ax.legend(loc="upper left")
-        ax.set_ylim(bottom=0)
-        ax.fmt_xdata = DateFormatter("% Y-% m-% d % H:% M:% S")
-        fig.autofmt_xdate()
-
-        await self.bot.send_image_file(ctx, fig, ctx.channel, "demographics-data")
+            # Long histories are averaged down to at most MAX_CHART_POINTS per role
+            samples = await connection.fetch("""SELECT role_reference, AVG(taken_at)::BIGINT AS taken_at, AVG(n)::FLOAT AS n
+                FROM (
+                    SELECT role_reference, EXTRACT(EPOCH FROM taken_at) AS taken_at, n,
+                        ntile($2) OVER (PARTITION BY role_reference ORDER BY taken_at) AS bucket
+                    FROM demographic_samples WHERE role_reference = ANY($1)
+                ) AS buckets
+                GROUP BY role_reference, bucket ORDER BY role_reference, taken_at""", list(roles),
+                                             self.MAX_CHART_POINTS)
+
+        by_role = {}
+        for record in samples:
+            by_role.setdefault(record["role_reference"], []).append((record["taken_at"], record["n"]))
+
+        series = []
+        for demographic_role_id, role in roles.items():
+            data = np.array(by_role.get(demographic_role_id, []), dtype=np.float64).reshape(-1, 2)
+            rgb_scaled_tuple = tuple(x / 255 for x in role.color.to_rgb())  # Scale 0-255 integers down to 0-1 floats
+            series.append((role.name, rgb_scaled_tuple, data[:, 0].astype(np.int64), data[:, 1]))
+
+        if not self.render_pool:
+            self.render_pool = ProcessPoolExecutor(max_workers=1)
+        image = await self.bot.loop.run_in_executor(self.render_pool, render_chart, title, series)
+        self.charts[ctx.guild.id] = (cache_key, image)
+
+        await self.bot.send_image_file(ctx, image, ctx.channel, "demographics-data")
+
+    async def close_render_pool(self) -> None:
+        if self.render_pool:
+            self.render_pool.shutdown(wait=False, cancel_futures=True)
+            self.render_pool = None
@@ -1,3 +1,6 @@
+import asyncio
+import json
+from collections import OrderedDict
 from math import ceil
 from typing import Optional
 
@@ -10,16 +13,25 @@ from libs.misc.utils import get_user_avatar_url
 
 
 class Logging(commands.Cog):
+    INVITE_REFRESH_DELAY = 2  # seconds to wait for more joins before refreshing a guild's invites
+    MAX_INV_LOG_HASHES = 1000
+
     def __init__(self, bot: AdamBot) -> None:
         self.bot = bot
-        self.previous_inv_log_embeds = []
+        self.previous_inv_log_embeds = OrderedDict()  # Hashes of recent invite logs, oldest first, so they aren't sent twice
         self.guilds = []
-        self.invites = {}
+        self.invites = {}  # Links guild_id -> {invite code: uses}
+        self.pending_joins = {}  # Links guild_id -> members who joined while waiting to refresh the invites
 
     @staticmethod
     async def get_all_invites(guild: discord.Guild) -> list[discord.Invite]:
         return await guild.invites() + ([await guild.vanity_invite()] if "VANITY_URL" in guild.features else [])
 
+    async def refresh_invites(self, guild: discord.Guild) -> list[discord.Invite]:
+        invites = await self.get_all_invites(guild)
+        self.invites[guild.id] = {invite.code: invite.uses for invite in invites}
+        return invites
+
     async def get_log_channel(self, ctx: discord.ext.commands.Context | discord.Guild | int,
                               name: str) -> discord.TextChannel | discord.Thread:
 
@@ -35,11 +47,18 @@ class Logging(commands.Cog):
     async def on_ready(self) -> None:
         self.guilds = self.bot.guilds
         for guild in self.guilds:
-            self.invites[guild.id] = await self.get_all_invites(guild)
+            await self.refresh_invites(guild)
 
     @commands.Cog.listener()
     async def on_guild_join(self, guild: discord.Guild) -> None:
-        self.invites[guild.id] = await self.get_all_invites(guild)
+        await self.refresh_invites(guild)
+
+    @commands.Cog.listener()
+    async def on_config_update(self, guild_id: int, key: str, value) -> None:
+        if key in ["join_leave_log_channel", "misc_log_channel"] and value:
+            guild = self.bot.get_guild(guild_id)
+            if guild:  # Joins aren't tracked while there's nowhere to log them, so the cached invites may be stale
+                await self.refresh_invites(guild)
 
     @commands.Cog.listener()
     async def on_message_delete(self, message: discord.Message) -> None:
@@ -68,7 +87,7 @@ class Logging(commands.Cog):
 
             embeds.append(embed)
 
-        [await channel.send(embed=embed) for embed in embeds]
+        [await self.bot.log_buffer.send(channel, embed) for embed in embeds]
 
         if message.reference:  # intended mainly for replies, can be used in other contexts (see docs)
             ref = await ctx.fetch_message(message.reference.message_id)
@@ -79,7 +98,7 @@ class Logging(commands.Cog):
             reference.add_field(name="Channel", value=ref.channel.mention, inline=True)
             reference.add_field(name="Jump Link", value=ref.jump_url)
 
-            await channel.send(embed=reference)
+            await self.bot.log_buffer.send(channel, reference)
 
     @commands.Cog.listener()
     async def on_raw_bulk_message_delete(self, payload: discord.RawBulkMessageDeleteEvent) -> None:
@@ -96,7 +115,7 @@ class Logging(commands.Cog):
         embed.add_field(name="Count", value=f"{len(payload.message_ids)}", inline=True)
         embed.add_field(name="Channel", value=msg_channel.mention, inline=True)
         embed.set_footer(text=self.bot.correct_time().strftime(self.bot.ts_format))
-        await channel.send(embed=embed)
+        await self.bot.log_buffer.send(channel, embed)
 
     @commands.Cog.listener()
     async def on_message_edit(self, before: discord.Message, after: discord.Message) -> None:
@@ -137,7 +156,7 @@ class Logging(commands.Cog):
 
             embeds.append(embed)
 
-        [await channel.send(embed=embed) for embed in embeds]
+        [await self.bot.log_buffer.send(channel, embed) for embed in embeds]
 
     @staticmethod
     async def role_comparison(before: discord.Member, after: discord.Member) -> tuple[list[discord.Role], list[discord.Role]]:
@@ -289,14 +308,14 @@ class Logging(commands.Cog):
                     if prop["display_name"] in ["Nickname", "Roles"]:
                         channel = await self.get_log_channel(before.guild, "member_update")
                         if channel:
-                            await channel.send(embed=log)
+                            await self.bot.log_buffer.send(channel, log)
 
                     else:
-                        shared_guilds = [x for x in self.bot.guilds if after in x.members]
+                        shared_guilds = self.bot.get_mutual_guilds(after.id)
                         for guild in shared_guilds:
                             channel = await self.get_log_channel(guild, "member_update")
                             if channel:
-                                await channel.send(embed=log)
+                                await self.bot.log_buffer.send(channel, log)
 
     @commands.Cog.listener()
     async def on_member_update(self, before: discord.Member, after: discord.Member) -> None:
@@ -346,78 +365,95 @@ class Logging(commands.Cog):
 
     @commands.Cog.listener()
     async def on_member_join(self, member: discord.Member) -> None:
+        """
+        Joins that arrive within INVITE_REFRESH_DELAY of each other share one refresh of the guild's invites
+        """
+
         guild = member.guild
+        if await self.get_log_channel(guild, "join_leave") is None:  # If invite channel not set
+            return
+
+        if guild.id in self.pending_joins:
+            self.pending_joins[guild.id].append(member)
+            return
+
+        self.pending_joins[guild.id] = [member]
+        await asyncio.sleep(self.INVITE_REFRESH_DELAY)
+        await self.log_joins(guild, self.pending_joins.pop(guild.id))
+
+    async def log_joins(self, guild: discord.Guild, members: list[discord.Member]) -> None:
+        """
+        Works out which invites were used by a batch of joins and logs them.
+
+        If only one invite's uses went up, or only one went up by exactly the number of members in the batch, every
+        member is logged as joining through it. Otherwise each invite whose uses went up is a possible invite for
+        each member.
+        """
+
+        old_invites = self.invites.get(guild.id, {})
+        new_invites = await self.refresh_invites(guild)
+        updated_invites = [invite for invite in new_invites if
+                           invite.uses > old_invites.get(invite.code, 0)]  # else new 0-use invites will be logged
+        if len(updated_invites) > 1:
+            exact_invites = [invite for invite in updated_invites if
+                             invite.uses - old_invites.get(invite.code, 0) == len(members)]
+            if len(exact_invites) == 1:
+                updated_invites = exact_invites
 
         ichannel = await self.get_log_channel(guild, "join_leave")
         if ichannel is None:  # If invite channel not set
             return
 
-        old_invites = self.invites[guild.id]
-        new_invites = await self.get_all_invites(guild)
-
-        updated_invites = []
-        # possible_joins_missed = False
-        for invite in new_invites:
-            found = False
-            for old_invite in old_invites:
-                if old_invite.code == invite.code:
-                    found = True
-                    if invite.uses > old_invite.uses:
-                        updated_invites.append(invite)
-                        # if invite.uses - old_invite.uses != 1:
-                        #     possible_joins_missed = True
-
-            if not found and invite.uses != 0:  # else 0-use invites will be logged
-                updated_invites.append(invite)  # new invites
-
-        self.invites[guild.id] = new_invites
-        if ichannel:  # still check & update invites in case channel is configured later
-            invite_log = Embed(title="Invite data", color=Colour.from_rgb(0, 0, 255))
-            if len(updated_invites) == 1:
-                invite_log.set_author(
-                    name=f"{updated_invites[0].inviter} ~ {updated_invites[0].inviter.display_name}" if updated_invites[
-                        0].inviter else f"{guild.name} ~ Vanity URL",
-                    icon_url=get_user_avatar_url(updated_invites[0].inviter, mode=1)[0])
-
-                invite_log.description = ":arrow_up: Inviter Avatar\n:arrow_right: Member Avatar"
-            else:
-                invite_log.description = ":arrow_right: Member Avatar"
-
-            invite_log.add_field(name="Member", value=f"{member.mention} [{member.name}] ({member.id})")
-
-            for x, invite in enumerate(updated_invites):
-                invite_log.add_field(
-                    name=f"\nPossible Invite #{x + 1}\n\nInviter" if len(updated_invites) != 1 else "Inviter",
-                    value=invite.inviter.mention if invite.inviter else "Server (Vanity)",
-                    inline=len(updated_invites) == 1)
-
-                invite_log.add_field(name="Code", value=invite.code)
-                invite_log.add_field(name="Channel", value=invite.channel.mention)
-                invite_log.add_field(name="Expires",
-                                     value=self.bot.time_str(invite.max_age) if invite.max_age != 0 else "Never")
-                invite_log.add_field(name="Uses",
-                                     value=str(invite.uses) + (f"/{invite.max_uses}" if invite.max_uses != 0 else ""))
-                invite_log.add_field(name="Invite Created",
-                                     value=self.bot.correct_time(invite.created_at).strftime(self.bot.ts_format),
-                                     inline=False)
-
-            invite_log.add_field(name="Account created",
-                                 value=self.bot.correct_time(member.created_at).strftime(self.bot.ts_format),
-                                 inline=False)
+        for member in members:
+            invite_log = self.make_invite_log(guild, member, updated_invites)
+            log_hash = hash(json.dumps(invite_log.to_dict(), sort_keys=True))
+            if log_hash not in self.previous_inv_log_embeds or not updated_invites:  # limits log spam e.g. if connection drops
+                self.previous_inv_log_embeds[log_hash] = None
+                while len(self.previous_inv_log_embeds) > self.MAX_INV_LOG_HASHES:
+                    self.previous_inv_log_embeds.popitem(last=False)
+                await ichannel.send(embed=invite_log)
 
-            if not updated_invites:
-                invite_log.add_field(name="Invite used", value="Server Discovery")
+    def make_invite_log(self, guild: discord.Guild, member: discord.Member,
+                        updated_invites: list[discord.Invite]) -> Embed:
+        invite_log = Embed(title="Invite data", color=Colour.from_rgb(0, 0, 255))
+        if len(updated_invites) == 1:
+            invite_log.set_author(
+                name=f"{updated_invites[0].inviter} ~ {updated_invites[0].inviter.display_name}" if updated_invites[
+                    0].inviter else f"{guild.name} ~ Vanity URL",
+                icon_url=get_user_avatar_url(updated_invites[0].inviter, mode=1)[0])
+
+            invite_log.description = ":arrow_up: Inviter Avatar\n:arrow_right: Member Avatar"
+        else:
+            invite_log.description = ":arrow_right: Member Avatar"
+
+        invite_log.add_field(name="Member", value=f"{member.mention} [{member.name}] ({member.id})")
+
+        for x, invite in enumerate(updated_invites):
+            invite_log.add_field(
+                name=f"\nPossible Invite #{x + 1}\n\nInviter" if len(updated_invites) != 1 else "Inviter",
+                value=invite.inviter.mention if invite.inviter else "Server (Vanity)",
+                inline=len(updated_invites) == 1)
+
+            invite_log.add_field(name="Code", value=invite.code)
+            invite_log.add_field(name="Channel", value=invite.channel.mention)
+            invite_log.add_field(name="Expires",
+                                 value=self.bot.time_str(invite.max_age) if invite.max_age != 0 else "Never")
+            invite_log.add_field(name="Uses",
+                                 value=str(invite.uses) + (f"/{invite.max_uses}" if invite.max_uses != 0 else ""))
+            invite_log.add_field(name="Invite Created",
+                                 value=self.bot.correct_time(invite.created_at).strftime(self.bot.ts_format),
+                                 inline=False)
 
-            invite_log.set_thumbnail(url=get_user_avatar_url(member, mode=1)[0])
-            invite_log.set_footer(text=self.bot.correct_time().strftime(self.bot.ts_format))
-            if (
-                    invite_log.to_dict() not in self.previous_inv_log_embeds) or not updated_invites:  # limits log spam e.g. if connection drops
+        invite_log.add_field(name="Account created",
+                             value=self.bot.correct_time(member.created_at).strftime(self.bot.ts_format),
+                             inline=False)
 
-                # if possible_joins_missed or len(updated_invites) != 1:
-                #    await get(guild.text_channels, name="invite-logs").send("*WARNING: Due to a bot glitch or other reason, the below data may be inaccurate due to potentially missed previous joins.*")
+        if not updated_invites:
+            invite_log.add_field(name="Invite used", value="Server Discovery")
 
-                self.previous_inv_log_embeds.append(invite_log.to_dict())
-                await ichannel.send(embed=invite_log)
+        invite_log.set_thumbnail(url=get_user_avatar_url(member, mode=1)[0])
+        invite_log.set_footer(text=self.bot.correct_time().strftime(self.bot.ts_format))
+        return invite_log
 
 
 async def setup(bot: AdamBot) -> None:
@@ -1,4 +1,4 @@
-import ast  # using ast for literal_eval, stops code injection
+import ast  # using ast for literal_eval, stops code injection. only needed to migrate the old filter table
 import asyncio
 from math import ceil
 from typing import Optional
@@ -11,6 +11,7 @@ from discord.ext import commands
 from adambot import AdamBot
 from libs.misc.decorators import is_staff, is_staff_slash
 from . import filter_handlers
+from .filter_matcher import FilterMatcher
 
 
 class Filter(commands.Cog):
@@ -22,59 +23,138 @@ class Filter(commands.Cog):
         """
 
         self.filters = {}
+        self.stored = {}  # guild_id -> {"filtered": set, "ignored": set} of the phrases in the DB, so only changes get written
+        self.matchers = {}  # guild_id -> FilterMatcher compiled from self.filters
+        self.prefixes = {}  # guild_id -> prefixes sorted longest first, see get_sorted_prefixes
         self.bot = bot
         self.Handlers = filter_handlers.FilterHandlers(bot, self)
 
     filter_slash = app_commands.Group(name="filter", description="View the server filter")
 
+    async def get_sorted_prefixes(self, guild: discord.Guild) -> list[str]:
+        """
+        Returns the prefixes usable in `guild`, longest first. Cached until the guild's prefix changes.
+        """
+
+        if guild.id in self.prefixes:
+            return self.prefixes[guild.id]
+
+        prefixes = await self.bot.get_used_prefixes(guild)
+        prefixes.sort(key=len, reverse=True)
+        if guild.id in getattr(self.bot, "configs", {}):  # don't cache until the guild's config has loaded
+            self.prefixes[guild.id] = prefixes
+        return prefixes
+
     async def check_is_command(self, message: discord.Message) -> bool:
         """
         Checks whether or not `message` is a valid filter command or not
         """
 
-        ctx = await self.bot.get_context(message)
         content = message.content
-        prefixes = await self.bot.get_used_prefixes(message)
-        prefixes.sort(key=len, reverse=True)
-        for prefix in prefixes:
+        for prefix in await self.get_sorted_prefixes(message.guild):
             if content.startswith(prefix):
                 content = content.replace(prefix, "")
                 break
 
-        is_command = True if (await self.bot.is_staff(ctx) and content.startswith(
-            "filter") and content != message.content) else False
+        if not content.startswith("filter") or content == message.content:
+            return False
 
-        return is_command
+        ctx = await self.bot.get_context(message)  # only worth building a context for the staff check
+        return bool(await self.bot.is_staff(ctx))
 
-    async def load_filters(self, guild: discord.Guild) -> None:
+    async def migrate_legacy_filters(self) -> None:
         """
-        Method used to load filter data for all guilds into self.filters
+        One-time migration of the old `filter` table, which kept each guild's lists as the repr of a dict, into
+        filter_phrases. The old table is kept as filter_legacy rather than dropped.
         """
 
         async with self.bot.pool.acquire() as connection:
-            prop = await connection.fetchval("SELECT filters FROM filter WHERE guild_id = $1", guild.id)
-            if not prop:
-                await connection.execute("INSERT INTO filter (guild_id, filters) VALUES ($1, $2)", guild.id,
-                                         "{'filtered':[], 'ignored':[]}")
-                self.filters[guild.id] = {"filtered": [], "ignored": []}
-
-            else:
-                prop = ast.literal_eval(prop)
+            if not await connection.fetchval("SELECT to_regclass('filter')"):
+                return  # already migrated
+
+            rows = []
+            for record in await connection.fetch("SELECT guild_id, filters FROM filter"):
+                try:
+                    prop = ast.literal_eval(record["filters"])
+                except (ValueError, SyntaxError):
+                    continue
                 if type(prop) is not dict or not ("filtered" in prop and "ignored" in prop):
-                    await connection.execute("UPDATE filter SET filters = $1 WHERE guild_id = $2",
-                                             "{'filtered':[], 'ignored':[]}", guild.id)
-                    self.filters[guild.id] = {"filtered": [], "ignored": []}
-                else:
-                    self.filters[guild.id] = prop
+                    continue
+                rows += [(record["guild_id"], phrase, False) for phrase in prop["filtered"]]
+                rows += [(record["guild_id"], phrase, True) for phrase in prop["ignored"]]
+
+            async with connection.transaction():
+                await connection.executemany(
+                    "INSERT INTO filter_phrases (guild_id, phrase, ignored) VALUES ($1, $2, $3) ON CONFLICT DO NOTHING",
+                    rows)
+                await connection.execute("ALTER TABLE filter RENAME TO filter_legacy")
+            print(f"Migrated {len(rows)} filter phrases to filter_phrases")
+
+    async def load_filters(self, guild: discord.Guild) -> None:
+        """
+        Method used to load filter data for a guild into self.filters
+        """
+
+        await self.load_all_filters([guild])
+
+    async def load_all_filters(self, guilds: list[discord.Guild]) -> None:
+        """
+        Loads the filter data for every guild in `guilds` with a single query, then compiles their matchers in a thread
+        pool so the event loop isn't blocked by large filter lists.
+        """
+
+        guild_ids = [guild.id for guild in guilds]
+        async with self.bot.pool.acquire() as connection:
+            phrases = await connection.fetch(
+                "SELECT guild_id, phrase, ignored FROM filter_phrases WHERE guild_id = ANY($1) ORDER BY id", guild_ids)
+
+        filters = {guild_id: {"filtered": [], "ignored": []} for guild_id in guild_ids}  # guilds without phrases just get empty lists
+        for phrase in phrases:
+            filters[phrase["guild_id"]]["ignored" if phrase["ignored"] else "filtered"].append(phrase["phrase"])
+
+        matchers = await asyncio.gather(
+            *[self.bot.loop.run_in_executor(None, FilterMatcher, filters[guild_id]["filtered"],
+                                            filters[guild_id]["ignored"]) for guild_id in guild_ids])
+
+        for guild_id, matcher in zip(guild_ids, matchers):
+            self.filters[guild_id] = filters[guild_id]
+            self.stored[guild_id] = {key: set(filters[guild_id][key]) for key in filters[guild_id]}
+            self.matchers[guild_id] = matcher
+
+    def compile_filter(self, guild_id: int) -> None:
+        """
+        Rebuilds the matcher for a guild, needs doing whenever its filtered or ignored lists change
+        """
+
+        filters = self.filters[guild_id]
+        self.matchers[guild_id] = FilterMatcher(filters["filtered"], filters["ignored"])
 
     async def propagate_new_guild_filter(self, guild: discord.Guild) -> None:
         """
         Method used for pushing filter changes to the DB
+
+        Only the phrases added or removed since the last push are written, each phrase being its own row.
         """
 
+        self.compile_filter(guild.id)
+        stored = self.stored.setdefault(guild.id, {"filtered": set(), "ignored": set()})
         async with self.bot.pool.acquire() as connection:
-            await connection.execute("UPDATE filter SET filters = $1 WHERE guild_id = $2", str(self.filters[guild.id]),
-                                     guild.id)
+            async with connection.transaction():
+                for key in ["filtered", "ignored"]:
+                    current = set(self.filters[guild.id][key])
+                    removed = stored[key] - current
+                    if removed:
+                        await connection.execute(
+                            "DELETE FROM filter_phrases WHERE guild_id = $1 AND ignored = $2 AND phrase = ANY($3)",
+                            guild.id, key == "ignored", list(removed))
+
+                    added = [phrase for phrase in self.filters[guild.id][key] if phrase not in stored[key]]  # keeps list order
+                    if added:
+                        await connection.executemany(
+                            "INSERT INTO filter_phrases (guild_id, phrase, ignored) VALUES ($1, $2, $3) ON CONFLICT DO NOTHING",
+                            [(guild.id, phrase, key == "ignored") for phrase in added])
+
+        self.stored[guild.id] = {key: set(self.filters[guild.id][key]) for key in self.filters[guild.id]}
 
     # ---LISTENERS---
 
@@ -84,14 +164,19 @@ class Filter(commands.Cog):
         success = False
         while not success:  # race condition for table to be created otherwise
             try:
-                for guild in self.bot.guilds:
-                    await self.load_filters(guild)
-                    success = True
+                await self.migrate_legacy_filters()
+                await self.load_all_filters(self.bot.guilds)
+                success = True
             except asyncpg.exceptions.UndefinedTableError:
                 success = False
-                print("filter table doesn't exist yet, waiting 1 second...")
+                print("filter_phrases table doesn't exist yet, waiting 1 second...")
                 await asyncio.sleep(1)
 
+    @commands.Cog.listener()
+    async def on_config_update(self, guild_id: int, key: str, value) -> None:
+        if key == "prefix":
+            self.prefixes.pop(guild_id, None)
+
     @commands.Cog.listener()
     async def on_message(self, message: discord.Message) -> None:
         """
@@ -118,29 +203,34 @@ class Filter(commands.Cog):
     async def handle_message(self, message: discord.Message) -> None:
         """
         Checks whether a message should be removed.
-        """
 
-        ctx = await self.bot.get_context(message)
-        is_command = await self.check_is_command(message)
-        if not is_command and message.author.id == self.bot.user.id and message.reference:
-            is_command = await self.check_is_command(await ctx.fetch_message(message.reference.message_id))
+        The phrase match is done first since it's cheap, the checks for whether the message is a filter command
+        (which need a context, the prefixes and possibly the replied-to message) only happen if something trips.
+        """
 
         try:
-            filters = self.filters[message.guild.id]
-            msg = message.content.lower()
-            for ignore in filters["ignored"]:
-                msg = msg.replace(ignore.lower(), "")
+            matcher = self.matchers.get(message.guild.id)
+            if not matcher:
+                return  # the bot hasn't loaded the filters yet
+            tripped = matcher.match(message.content)
+            if not tripped:
+                return
+
+            is_command = await self.check_is_command(message)
+            if not is_command and message.author.id == self.bot.user.id and message.reference:
+                referenced = message.reference.cached_message or await message.channel.fetch_message(
+                    message.reference.message_id)
+                is_command = await self.check_is_command(referenced)
 
-            tripped = [phrase.lower() for phrase in filters["filtered"] if phrase.lower() in msg]
             disp_tripped = "||" + (" ,".join([f"'{trip}'" for trip in tripped[:10]])) + (
                 f"(+ {len(tripped) - 10} more)" if len(tripped) > 10 else "") + "||"
-            if tripped and not is_command:
+            if not is_command:
                 # case insensitive is probably the best idea
                 await message.delete()
 
-                log_channel = self.bot.get_channel(await self.bot.get_config_key(ctx, "filter_log_channel"))
+                log_channel = self.bot.get_channel(await self.bot.get_config_key(message, "filter_log_channel"))
                 log_channel = self.bot.get_channel(
-                    await self.bot.get_config_key(ctx, "log_channel")) if not log_channel else log_channel
+                    await self.bot.get_config_key(message, "log_channel")) if not log_channel else log_channel
                 if log_channel:
                     embeds = []
                     chunks = ceil(len(message.content) / 1020)
@@ -161,7 +251,7 @@ class Filter(commands.Cog):
 
                         embeds.append(embed)
 
-                    [await log_channel.send(embed=embed) for embed in embeds]
+                    [await self.bot.log_buffer.send(log_channel, embed) for embed in embeds]
 
         except Exception:  # If the bot hasn't loaded the filters yet
             pass
@@ -0,0 +1,102 @@
+class FilterMatcher:
+    """
+    Aho-Corasick automaton over a guild's filtered and ignored phrases, so a message can be checked against both lists
+    in a single pass rather than one scan per phrase.
+
+    A filtered phrase trips if it occurs in the message without overlapping an occurrence of an ignored phrase, which
+    is what removing the ignored phrases before searching for the filtered ones used to achieve.
+    """
+
+    def __init__(self, filtered: list[str], ignored: list[str]) -> None:
+        self.filtered = [phrase.lower() for phrase in filtered]
+        self.ignored = [phrase.lower() for phrase in ignored]
+
+        self.goto = [{}]  # node -> {character: node}
+        self.fail = [0]
+        self.output = [[]]  # node -> [(phrase length, phrase index, is ignored phrase)] of every phrase ending here
+
+        for is_ignored, phrases in ((False, self.filtered), (True, self.ignored)):
+            for i, phrase in enumerate(phrases):
+                if phrase:
+                    self.add_phrase(phrase, (len(phrase), i, is_ignored))
+
+        self.build_fail_links()
+
+    def add_phrase(self, phrase: str, output: tuple[int, int, bool]) -> None:
+        node = 0
+        for character in phrase:
+            next_node = self.goto[node].get(character)
+            if next_node is None:
+                next_node = len(self.goto)
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+                self.goto[node][character] = next_node
+            node = next_node
+        self.output[node].append(output)
+
+    def build_fail_links(self) -> None:
+        """
+        Breadth-first, so that a node's fail link is always worked out before its children need it
+        """
+
+        queue = list(self.goto[0].values())  # children of the root fail back to the root
+        for node in queue:  # queue grows as it's iterated over
+            for character, child in self.goto[node].items():
+                fail = self.fail[node]
+                while fail and character not in self.goto[fail]:
+                    fail = self.fail[fail]
+                self.fail[child] = self.goto[fail].get(character, 0)
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+                queue.append(child)
+
+    def match(self, text: str) -> list[str]:
+        """
+        Returns the filtered phrases that `text` trips, in the order they appear in the filtered list. Case insensitive.
+        """
+
+        goto = self.goto
+        fail = self.fail
+        output = self.output
+
+        text = text.lower()
+        hits = []  # (start, end, phrase index) of filtered phrases
+        ignored_spans = []
+        node = 0
+        for end, character in enumerate(text, start=1):
+            while node and character not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(character, 0)
+            for length, i, is_ignored in output[node]:
+                if is_ignored:
+                    ignored_spans.append((end - length, end))
+                else:
+                    hits.append((end - length, end, i))
+
+        if not hits:
+            return []
+
+        if ignored_spans:
+            hits = self.remove_ignored(hits, ignored_spans, len(text))
+
+        return [self.filtered[i] for i in sorted({i for _, _, i in hits})]
+
+    @staticmethod
+    def remove_ignored(hits: list[tuple[int, int, int]], ignored_spans: list[tuple[int, int]],
+                       length: int) -> list[tuple[int, int, int]]:
+        """
+        Drops any hits that overlap an ignored span
+        """
+
+        depth = [0] * (length + 2)
+        for start, end in ignored_spans:
+            depth[start] += 1
+            depth[end] -= 1
+
+        covered = [0] * (length + 2)  # covered[i] = how many of the first i characters are within an ignored span
+        running = 0
+        for i in range(length + 1):
+            running += depth[i]
+            covered[i + 1] = covered[i] + (running > 0)
+
+        return [hit for hit in hits if covered[hit[1]] == covered[hit[0]]]
@@ -26,11 +26,10 @@ class WarningHandlers:
         else:
             author = ctx.user
 
-        async with self.bot.pool.acquire() as connection:
-            warns = await connection.fetch("SELECT * FROM warn WHERE member_id = ($1) AND guild_id = $2 ORDER BY id;",
-                                           member.id, ctx.guild.id)
+        warns = self.bot.QueryPageSource(self.bot.pool, "SELECT * FROM warn WHERE member_id = ($1) AND guild_id = $2",
+                                         member.id, ctx.guild.id)
 
-        if len(warns) > 0:
+        if await warns.count() > 0:
             embed = self.bot.EmbedPages(
                 self.bot.PageTypes.WARN,
                 warns,
@@ -106,10 +105,9 @@ class WarningHandlers:
         if await self.bot.is_staff(ctx):
             if not member:
                 # Show all warns
-                async with self.bot.pool.acquire() as connection:
-                    warns = await connection.fetch("SELECT * FROM warn WHERE guild_id = $1 ORDER BY id;", ctx.guild.id)
+                warns = self.bot.QueryPageSource(self.bot.pool, "SELECT * FROM warn WHERE guild_id = $1", ctx.guild.id)
 
-                if len(warns) > 0:
+                if await warns.count() > 0:
                     embed = self.bot.EmbedPages(
                         self.bot.PageTypes.WARN,
                         warns,
@@ -1,3 +1,5 @@
+import asyncio
+
 import discord
 from discord import app_commands
 from discord.ext import commands
@@ -12,12 +14,22 @@ class ReactionRoles(commands.Cog):
 
         self.Handlers = reactionroles_handlers.ReactionrolesHandlers(bot)
 
+    @commands.Cog.listener()
+    async def on_ready(self) -> None:
+        while not self.bot.online:
+            await asyncio.sleep(1)  # Wait else DB won't be available
+
+        await self.Handlers.load_roles()
+
     @commands.Cog.listener()
     async def on_raw_reaction_add(self, payload) -> None:
         """
         Checks if the reaction was added onto a reaction role message, and if so it is handled
         """
 
+        if payload.message_id not in self.Handlers.messages:
+            return
+
         guild = self.bot.get_guild(payload.guild_id)
         member = guild.get_member(payload.user_id)
         if member.bot:
@@ -38,6 +50,9 @@ class ReactionRoles(commands.Cog):
         Checks if the reaction was removed from a reaction role message, and if so it is handled
         """
 
+        if payload.message_id not in self.Handlers.messages:
+            return
+
         guild = self.bot.get_guild(payload.guild_id)
         member = guild.get_member(payload.user_id)
         if member.bot:
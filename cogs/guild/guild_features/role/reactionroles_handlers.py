@@ -12,26 +12,51 @@ class ReactionrolesHandlers:
     def __init__(self, bot: AdamBot) -> None:
         self.bot = bot
         self.ContextTypes = self.bot.ContextTypes
+        self.roles = {}  # Links (message_id, emoji_id or emoji) -> [(role_id, inverse)]
+        self.messages = set()  # IDs of every message with a reaction role, so other reactions can be ignored
 
-    async def _get_roles(self, payload) -> Optional[list]:
+    async def load_roles(self) -> None:
         """
-        Returns a list of (discord.Role, bool) pairs for the given `payload`. bool refers to whether the reaction role gives or removes a role on reaction add.
+        Loads every reaction role into `self.roles`, so reactions never need to go to the DB
         """
 
         async with self.bot.pool.acquire() as connection:
-            data = await connection.fetch(
-                "SELECT role_id, inverse FROM reaction_roles WHERE message_id = $1 AND (emoji_id = $2 OR emoji = $3);",
-                payload.message_id, payload.emoji.id, str(payload.emoji))
+            data = await connection.fetch("SELECT message_id, emoji_id, emoji, role_id, inverse FROM reaction_roles;")
+
+        self.roles = {}
+        self.messages = set()
+        for record in data:
+            self._index_role(record["message_id"], record["emoji_id"] or record["emoji"], record["role_id"],
+                             record["inverse"])
+
+    def _index_role(self, message_id: int, emoji_key: int | str, role_id: int, inverse: bool) -> None:
+        self.roles.setdefault((message_id, emoji_key), []).append((role_id, inverse))
+        self.messages.add(message_id)
+
+    def _unindex_roles(self, message_id: int, emoji_key: int | str = None) -> None:
+        """
+        Removes the reaction roles for the given emoji on a message, or all of them if no emoji is given
+        """
+
+        if emoji_key is not None:
+            self.roles.pop((message_id, emoji_key), None)
+        else:
+            self.roles = {key: roles for key, roles in self.roles.items() if key[0] != message_id}
 
+        if emoji_key is None or not any(key[0] == message_id for key in self.roles):
+            self.messages.discard(message_id)
+
+    async def _get_roles(self, payload) -> Optional[list]:
+        """
+        Returns a list of (discord.Role, bool) pairs for the given `payload`. bool refers to whether the reaction role gives or removes a role on reaction add.
+        """
+
+        data = self.roles.get((payload.message_id, payload.emoji.id or str(payload.emoji)))
         guild = self.bot.get_guild(payload.guild_id)
         if not data or not guild:
             return None
 
-        to_return = []
-        for i in range(len(data)):
-            role = guild.get_role(data[i][0])  # Get the role and add to to_return
-            to_return.append([role, data[i][1]])
-        return to_return
+        return [[guild.get_role(role_id), inverse] for role_id, inverse in data]
 
     async def add(self, ctx: commands.Context | discord.Interaction, emoji: discord.Emoji | str, role: discord.Role,
                   inverse: bool | str = None, message_id: int | str = None) -> None:
@@ -85,6 +110,8 @@ class ReactionrolesHandlers:
             if message_id.isdigit():
                 message_id = int(message_id)
 
+        self._index_role(message_id, emoji.id if custom_emoji else emoji, role.id, bool(inverse))
+
         message = await ctx.channel.fetch_message(message_id) if type(message_id) is int else None
         if message:
             await message.add_reaction(emoji)
@@ -123,6 +150,8 @@ class ReactionrolesHandlers:
             if message_id.isdigit():
                 message_id = int(message_id)
 
+        self._unindex_roles(message_id, emoji.id if custom_emoji else str(emoji))
+
         message = await ctx.channel.fetch_message(message_id) if type(message_id) is int else None
         if message:
             await message.clear_reaction(emoji)
@@ -147,6 +176,8 @@ class ReactionrolesHandlers:
             if message_id.isdigit():
                 message_id = int(message_id)
 
+        self._unindex_roles(message_id)
+
         message = await ctx.channel.fetch_message(message_id) if type(message_id) is int else None
         if message:
             await message.clear_reactions()
@@ -19,6 +19,7 @@ class Starboard(commands.Cog):
 
         self.bot = bot
         self.starboards = {}  # Links channel_id -> Starboard
+        self.guild_starboards = {}  # Links guild_id -> {channel_id: Starboard}
         self.Handlers = starboard_handlers.StarboardHandlers(bot, self)
 
     # TODO: Some help commands when args are missing would be nice
@@ -60,6 +61,9 @@ class Starboard(commands.Cog):
             starboards = await connection.fetch("SELECT * FROM starboard;")
             entries = await connection.fetch("SELECT * FROM starboard_entry;")
             self.starboards = await StarboardContainer.make_starboards(starboards, entries, self.bot)
+        self.guild_starboards = {}
+        for starboard in self.starboards.values():
+            self.guild_starboards.setdefault(starboard.guild.id, {})[starboard.channel.id] = starboard
 
     # --- Commands ---
 
@@ -1,3 +1,4 @@
+from collections import OrderedDict
 from typing import Optional
 
 import discord
@@ -5,24 +6,55 @@ import discord
 
 class StarboardContainer:
     class Entry:
-        @classmethod
-        async def make_entry(cls, record: dict, bot: discord.Client) -> __qualname__:
-            super().__init__(cls)
-            self = StarboardContainer.Entry()
+        """
+        A starboarded message. Only the ids are kept, the bot's message is fetched the first time it's needed and then
+        held in an LRU shared by every entry.
+        """
+
+        __slots__ = ("bot", "message_id", "bot_message_id", "channel_id")
+        MAX_CACHED_MESSAGES = 500
+        bot_messages = OrderedDict()  # Links bot_message_id -> discord.Message, least recently used first
+
+        def __init__(self, record: dict, bot: discord.Client) -> None:
             self.bot = bot
             self.bot_message_id = record["bot_message_id"]
             self.message_id = record["message_id"]
             self.channel_id = record["starboard_channel_id"]  # Channel ID of bot message
+
+        @classmethod
+        def cache_bot_message(cls, message: discord.Message) -> None:
+            cls.bot_messages[message.id] = message
+            cls.bot_messages.move_to_end(message.id)
+            while len(cls.bot_messages) > cls.MAX_CACHED_MESSAGES:
+                cls.bot_messages.popitem(last=False)
+
+        def forget_bot_message(self) -> None:
+            self.bot_messages.pop(self.bot_message_id, None)
+
+        async def get_bot_message(self) -> Optional[discord.Message]:
+            """
+            Returns the bot's message for this entry, or None if it has been deleted
+            """
+
+            message = self.bot_messages.get(self.bot_message_id)
+            if message:
+                self.bot_messages.move_to_end(self.bot_message_id)
+                return message
+
+            channel = self.bot.get_channel(self.channel_id)
+            if not channel:
+                return None
             try:
-                self.channel = bot.get_channel(self.channel_id)
-                self.bot_message = await self.channel.fetch_message(self.bot_message_id)
+                message = await channel.fetch_message(self.bot_message_id)
             except discord.NotFound:
-                self.channel = self.bot_message = None
-            return self
+                return None
+            self.cache_bot_message(message)
+            return message
 
         async def update_bot_message(self, new_msg: discord.Message) -> None:
-            self.bot_message = new_msg
+            self.forget_bot_message()
             self.bot_message_id = new_msg.id
+            self.cache_bot_message(new_msg)
             async with self.bot.pool.acquire() as connection:
                 await connection.execute(
                     "UPDATE starboard_entry SET bot_message_id = $1 WHERE starboard_channel_id = $2 AND message_id = $3;",
@@ -38,7 +70,7 @@ class StarboardContainer:
         self.embed_colour = record["embed_colour"]
         self.allow_self_star = record["allow_self_star"]
         self.record = record
-        self.entries = []
+        self.entries = {}  # Links message_id -> Entry
 
     @classmethod
     async def make_starboards(cls, records: list, entries: list, bot: discord.Client) -> dict:
@@ -51,9 +83,9 @@ class StarboardContainer:
             obj = StarboardContainer(record, bot)
             starboards[obj.channel.id] = obj  # Make empty starboard
         for entry in entries:
-            obj = await StarboardContainer.Entry.make_entry(entry, bot)
-            starboards[entry["starboard_channel_id"]].entries.append(
-                obj)  # Add all entries to their respective starboard
+            obj = StarboardContainer.Entry(entry, bot)
+            starboards[entry["starboard_channel_id"]].entries[
+                obj.message_id] = obj  # Add all entries to their respective starboard
         return starboards
 
     def get_record(self) -> dict:
@@ -92,10 +124,7 @@ class StarboardContainer:
         Returns either a starboard entry or None if it doesn't exist
         """
 
-        for entry in self.entries:
-            if entry.message_id == message_id:
-                return entry
-        return None
+        return self.entries.get(message_id, None)
 
     async def create_entry(self, message_id: int, bot_message_id: int, starboard_channel_id: int,
                            bot: discord.Client) -> None:
@@ -107,11 +136,11 @@ class StarboardContainer:
             await connection.execute(
                 "INSERT INTO starboard_entry (message_id, starboard_channel_id, bot_message_id) VALUES ($1, $2, $3);",
                 message_id, self.channel.id, bot_message_id)
-        self.entries.append(await self.Entry.make_entry({
+        self.entries[message_id] = self.Entry({
             "message_id": message_id,
             "bot_message_id": bot_message_id,
             "starboard_channel_id": starboard_channel_id
-        }, bot))
+        }, bot)
 
     async def delete_entry(self, message_id: int) -> None:
         """
@@ -121,10 +150,6 @@ class StarboardContainer:
         async with self.bot.pool.acquire() as connection:
             await connection.execute("DELETE FROM starboard_entry WHERE starboard_channel_id = $1 AND message_id = $2;",
                                      self.channel.id, message_id)
-        indx = -1
-        for i, e in enumerate(
-                self.entries):  # TODO: What happens if found_entry is still None after search i.e. entry not found
-            if e.message_id == message_id:
-                indx = i
-                break
-        self.entries.pop(indx)
+        entry = self.entries.pop(message_id, None)
+        if entry:
+            entry.forget_bot_message()
@@ -1,5 +1,6 @@
 import asyncio
 import re
+from collections import OrderedDict
 from typing import Optional
 
 import discord
@@ -11,10 +12,15 @@ from .starboard_container import StarboardContainer
 
 
 class StarboardHandlers:
+    DEBOUNCE = 2  # seconds to collect reactions on a message before recounting it
+    MAX_TRACKED_REACTIONS = 1000  # how many (message, emoji) reactor sets are kept around
+
     def __init__(self, bot, cog) -> None:
         self.bot = bot
         self.cog = cog
         self.ContextTypes = self.bot.ContextTypes
+        self.pending = {}  # (message_id, emoji key) -> task that recounts the message once the debounce is up
+        self.reactors = OrderedDict()  # (message_id, emoji key) -> {user_id: is bot}, least recently used first
 
     # --- Starboard embed ---
     async def make_starboard_embed(self, message: discord.Message, stars: int, emoji: discord.Emoji,
@@ -60,11 +66,7 @@ class StarboardHandlers:
         Returns all a list of Starboard for a given guild
         """
 
-        results = []
-        for starboard in self.cog.starboards.values():
-            if starboard.guild.id == guild_id:
-                results.append(starboard)
-        return results
+        return list(self.cog.guild_starboards.get(guild_id, {}).values())
 
     async def _try_get_starboard(self, channel_id: int) -> Optional[StarboardContainer]:
         """
@@ -105,6 +107,7 @@ class StarboardHandlers:
         )
 
         self.cog.starboards[channel.id] = new_starboard
+        self.cog.guild_starboards.setdefault(channel.guild.id, {})[channel.id] = new_starboard
 
     async def _delete_starboard(self, channel: discord.TextChannel | discord.Thread) -> None:
         """
@@ -112,6 +115,10 @@ class StarboardHandlers:
         """
 
         del self.cog.starboards[channel.id]  # Remove from starboards
+        guild_starboards = self.cog.guild_starboards.get(channel.guild.id, {})
+        guild_starboards.pop(channel.id, None)
+        if not guild_starboards:
+            self.cog.guild_starboards.pop(channel.guild.id, None)
         async with self.bot.pool.acquire() as connection:
             await connection.execute("DELETE FROM starboard WHERE channel_id = $1;", channel.id)
 
@@ -175,7 +182,84 @@ class StarboardHandlers:
         except asyncio.TimeoutError:
             return None
 
-    async def on_raw_reaction_event(self, payload) -> None:
+    @staticmethod
+    def _emoji_key(emoji: discord.PartialEmoji | discord.Emoji | str) -> int | str:
+        if isinstance(emoji, str):
+            return emoji
+        return emoji.id or emoji.name
+
+    def _track_reaction(self, payload: discord.RawReactionActionEvent) -> None:
+        """
+        Keeps the reactor set for the message up to date, if there is one. Sets are only made when the message is first
+        recounted, since that's when all the reactions from before the bot was watching can be fetched.
+        """
+
+        reactors = self.reactors.get((payload.message_id, self._emoji_key(payload.emoji)))
+        if reactors is None:
+            return
+
+        if payload.event_type == "REACTION_ADD":
+            if payload.member:
+                is_bot = payload.member.bot
+            else:
+                user = self.bot.get_user(payload.user_id)
+                is_bot = user.bot if user else False
+            reactors[payload.user_id] = is_bot
+        else:
+            reactors.pop(payload.user_id, None)
+
+    async def _count_stars(self, message: discord.Message, reaction: discord.Reaction, allow_self_star: bool) -> int:
+        """
+        Works out the number of stars from a reaction, which doesn't include bots or (if not allowed) the author
+        """
+
+        key = (message.id, self._emoji_key(reaction.emoji))
+        reactors = self.reactors.get(key)
+        if reactors is None or len(reactors) != reaction.count:  # never seen or missed some events, so start afresh
+            reactors = {user.id: user.bot async for user in reaction.users()}
+            self.reactors[key] = reactors
+            while len(self.reactors) > self.MAX_TRACKED_REACTIONS:
+                self.reactors.popitem(last=False)
+        self.reactors.move_to_end(key)
+
+        deducted_stars = [user_id for user_id, is_bot in reactors.items() if is_bot or (
+                not allow_self_star and user_id == message.author.id)]  # Means that bots cannot star nor the author IF allow self star is False
+        return reaction.count - len(deducted_stars)
+
+    async def on_raw_reaction_event(self, payload: discord.RawReactionActionEvent) -> None:
+        """
+        Handles a star being added or removed. The recount is debounced, so a burst of reactions on a message only
+        leads to one fetch of the message and one edit of its starboard embed.
+        """
+
+        if not payload.guild_id:
+            return
+
+        starboards = [starboard for starboard in await self._get_starboards(payload.guild_id) if
+                      starboard.channel.id != payload.channel_id and (  # stops people spamming star react onto starboard embeds
+                              (starboard.emoji is not None and starboard.emoji == payload.emoji.name) or (
+                              starboard.emoji_id is not None and starboard.emoji_id == payload.emoji.id))]  # Valid emoji
+        if not starboards:
+            return
+
+        self._track_reaction(payload)
+        key = (payload.message_id, self._emoji_key(payload.emoji))
+        if key not in self.pending:
+            self.pending[key] = self.bot.loop.create_task(self._debounced_recount(payload, key))
+
+    async def _debounced_recount(self, payload: discord.RawReactionActionEvent, key: tuple[int, int | str]) -> None:
+        await asyncio.sleep(self.DEBOUNCE)
+        del self.pending[key]  # any reactions from here on get a recount of their own
+        try:
+            await self.recount(payload)
+        except discord.HTTPException as e:
+            print(f"{type(e).__name__}: {e}")
+
+    async def recount(self, payload: discord.RawReactionActionEvent) -> None:
+        """
+        Recounts the stars on a message and adds, updates or removes its entry on each starboard using that emoji
+        """
+
         try:
             message = await self.bot.get_channel(payload.channel_id).fetch_message(payload.message_id)
         except discord.NotFound:
@@ -205,37 +289,35 @@ class StarboardHandlers:
                     if (not r.is_custom_emoji() and r.emoji == payload.emoji.name) or (
                             r.is_custom_emoji() and r.emoji.id == payload.emoji.id):
                         # This is the reaction we want to process
-                        stars = r.count
                         # If the starboard has self star disabled, we need to remove a star if the author has reacted, as well as all stars from a bot
-                        deducted_stars = [u.id for u in await r.users().flatten() if u.bot or (
-                                not starboard.allow_self_star and u.id == message.author.id)]  # Means that bots cannot star nor the author IF allow self star is False
-                        stars -= len(deducted_stars)
+                        stars = await self._count_stars(message, r, starboard.allow_self_star)
 
                 minimum_met = stars >= starboard.minimum_stars
                 entry = await starboard.try_get_entry(payload.message_id)
+                bot_message = await entry.get_bot_message() if entry else None
                 if not minimum_met:
                     if entry:
                         await starboard.delete_entry(payload.message_id)
-                        if entry.bot_message:
-                            await entry.bot_message.delete()
+                        if bot_message:
+                            await bot_message.delete()
 
-                elif entry and entry.bot_message:  # If minimum met and entry
+                elif bot_message:  # If minimum met and entry
                     new_embed = await self.make_starboard_embed(message, stars, payload.emoji, colour)
                     try:
                         # Update bot message
-                        await entry.bot_message.edit(embed=new_embed)
+                        await bot_message.edit(embed=new_embed)
                     except discord.NotFound:
                         # Bot message deleted
                         msg = await starboard.channel.send(embed=new_embed)
                         await entry.update_bot_message(msg)
                 else:
-                    message = await self.bot.get_channel(payload.channel_id).fetch_message(payload.message_id)
                     # Message doesn't exist, make a new one
                     msg = await starboard.channel.send(
                         embed=await self.make_starboard_embed(message, stars, payload.emoji, colour))
                     if not entry:
                         await starboard.create_entry(payload.message_id, msg.id, starboard.channel.id, self.bot)
-                    elif entry or entry.bot_message is None:
+                        StarboardContainer.Entry.cache_bot_message(msg)
+                    else:
                         await entry.update_bot_message(msg)
 
     async def view(self, ctx: commands.Context | discord.Interaction) -> None:
@@ -94,10 +94,9 @@ class QOTDHandlers:
         else:
             author = ctx.user
 
-        async with self.bot.pool.acquire() as connection:
-            qotds = await connection.fetch("SELECT * FROM qotd WHERE guild_id = $1 ORDER BY id", ctx.guild.id)
+        qotds = self.bot.QueryPageSource(self.bot.pool, "SELECT * FROM qotd WHERE guild_id = $1", ctx.guild.id)
 
-        if len(qotds) > 0:
+        if await qotds.count() > 0:
             embed = self.bot.EmbedPages(
                 self.bot.PageTypes.QOTD,
                 qotds,
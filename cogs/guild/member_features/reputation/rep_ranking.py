@@ -0,0 +1,183 @@
+from bisect import bisect_left, insort
+
+
+class SortedList:
+    """
+    A sorted list kept as sublists of up to 2 * LOAD items, with a Fenwick tree over the sublist lengths. Adding,
+    removing and finding the position of an item only touch one short sublist and O(log n) tree nodes, rather than
+    shifting every later item as inserting into one big list does.
+    """
+
+    LOAD = 500
+
+    def __init__(self, items=()) -> None:
+        items = sorted(items)
+        self.lists = [items[i:i + self.LOAD] for i in range(0, len(items), self.LOAD)]
+        self.maxes = [sublist[-1] for sublist in self.lists]  # Last item of each sublist
+        self.length = len(items)
+        self.build_tree()
+
+    def __len__(self) -> int:
+        return self.length
+
+    def build_tree(self) -> None:
+        """
+        Rebuilds the Fenwick tree after sublists have been split or removed
+        """
+
+        self.tree = [0] * (len(self.lists) + 1)
+        for i, sublist in enumerate(self.lists, 1):
+            self.tree[i] += len(sublist)
+            parent = i + (i & -i)
+            if parent < len(self.tree):
+                self.tree[parent] += self.tree[i]
+
+    def tree_add(self, pos: int, change: int) -> None:
+        pos += 1
+        while pos < len(self.tree):
+            self.tree[pos] += change
+            pos += pos & -pos
+
+    def tree_prefix(self, pos: int) -> int:
+        """
+        Returns how many items are in the sublists before the one at `pos`
+        """
+
+        total = 0
+        while pos:
+            total += self.tree[pos]
+            pos -= pos & -pos
+        return total
+
+    def locate(self, index: int) -> tuple[int, int]:
+        """
+        Returns the (sublist, position within it) of the item at `index`
+        """
+
+        pos = 0
+        bit = 1 << len(self.tree).bit_length()
+        while bit:
+            if pos + bit < len(self.tree) and self.tree[pos + bit] <= index:
+                pos += bit
+                index -= self.tree[pos]
+            bit >>= 1
+        return pos, index
+
+    def add(self, item) -> None:
+        self.length += 1
+        if not self.lists:
+            self.lists.append([item])
+            self.maxes.append(item)
+            self.build_tree()
+            return
+
+        pos = bisect_left(self.maxes, item)
+        if pos == len(self.maxes):  # Bigger than everything, goes on the end of the last sublist
+            pos -= 1
+            self.lists[pos].append(item)
+            self.maxes[pos] = item
+        else:
+            insort(self.lists[pos], item)
+
+        sublist = self.lists[pos]
+        if len(sublist) > self.LOAD * 2:
+            self.lists[pos:pos + 1] = [sublist[:self.LOAD], sublist[self.LOAD:]]
+            self.maxes[pos:pos + 1] = [sublist[self.LOAD - 1], sublist[-1]]
+            self.build_tree()
+        else:
+            self.tree_add(pos, 1)
+
+    def remove(self, item) -> None:
+        """
+        Removes `item`, which must be in the list
+        """
+
+        pos = bisect_left(self.maxes, item)
+        sublist = self.lists[pos]
+        del sublist[bisect_left(sublist, item)]
+        self.length -= 1
+        if sublist:
+            self.maxes[pos] = sublist[-1]
+            self.tree_add(pos, -1)
+        else:
+            del self.lists[pos]
+            del self.maxes[pos]
+            self.build_tree()
+
+    def index(self, item) -> int:
+        """
+        Returns where `item` is, or would be inserted, in the list
+        """
+
+        pos = bisect_left(self.maxes, item)
+        if pos == len(self.maxes):
+            return self.length
+        return self.tree_prefix(pos) + bisect_left(self.lists[pos], item)
+
+    def slice(self, start: int, stop: int) -> list:
+        items = []
+        pos, offset = self.locate(start)
+        while pos < len(self.lists) and len(items) < stop - start:
+            items += self.lists[pos][offset:offset + stop - start - len(items)]
+            pos += 1
+            offset = 0
+        return items
+
+
+class RepRanking:
+    """
+    A guild's reputation points kept in leaderboard order, so ranks and leaderboard pages can be found in O(log n)
+    instead of sorting the guild's whole rep table each time.
+    """
+
+    def __init__(self, records: list[tuple[int, int]] = ()) -> None:
+        self.reps = {member_id: reps for member_id, reps in records}  # Links member_id -> reps
+        self.order = SortedList((-reps, member_id) for member_id, reps in self.reps.items())  # Highest reps first
+        self.counts = {}  # Links reps -> how many members have that many
+        for reps in self.reps.values():
+            self.counts[reps] = self.counts.get(reps, 0) + 1
+        self.distinct = SortedList(-reps for reps in self.counts)  # Every different number of reps, highest first
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def __getitem__(self, index: slice) -> list[tuple[int, int]]:
+        start, stop, _ = index.indices(len(self.order))
+        return self.page(start, stop)
+
+    def set(self, member_id: int, reps: int) -> None:
+        self.remove(member_id)
+        self.reps[member_id] = reps
+        self.order.add((-reps, member_id))
+        if not self.counts.get(reps):
+            self.distinct.add(-reps)
+        self.counts[reps] = self.counts.get(reps, 0) + 1
+
+    def remove(self, member_id: int) -> None:
+        reps = self.reps.pop(member_id, None)
+        if reps is None:
+            return
+
+        self.order.remove((-reps, member_id))
+        self.counts[reps] -= 1
+        if not self.counts[reps]:
+            del self.counts[reps]
+            self.distinct.remove(-reps)
+
+    def rank(self, member_id: int) -> int | None:
+        """
+        Returns the member's leaderboard position, where members with the same reps share a position, or None if they
+        have no reps
+        """
+
+        reps = self.reps.get(member_id)
+        if reps is None:
+            return None
+        return self.distinct.index(-reps) + 1
+
+    def page(self, start: int, stop: int) -> list[tuple[int, int]]:
+        """
+        Returns the (member_id, reps) pairs from `start` to `stop` on the leaderboard
+        """
+
+        return [(member_id, -negative_reps) for negative_reps, member_id in self.order.slice(start, stop)]
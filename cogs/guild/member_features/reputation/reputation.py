@@ -1,3 +1,5 @@
+import asyncio
+
 import discord
 from discord import app_commands
 from discord.ext import commands
@@ -17,6 +19,21 @@ class Reputation(commands.Cog):
         self.bot = bot
         self.Handlers = reputation_handlers.ReputationHandlers(bot)
 
+    @commands.Cog.listener()
+    async def on_ready(self) -> None:
+        while not self.bot.online:
+            await asyncio.sleep(1)  # Wait else DB won't be available
+
+        await self.Handlers.load_rankings()
+
+    @commands.Cog.listener()
+    async def on_member_join(self, member: discord.Member) -> None:
+        await self.Handlers.rank_member(member)
+
+    @commands.Cog.listener()
+    async def on_member_remove(self, member: discord.Member) -> None:
+        self.Handlers.get_ranking(member.guild.id).remove(member.id)  # Their reps are kept in case they come back
+
     # -----------------------REP COMMANDS------------------------------
     rep_slash = app_commands.Group(name="rep", description="Award, view or manage server members' reputation points")
 
@@ -5,12 +5,45 @@ from discord.ext import commands
 
 from adambot import AdamBot
 from libs.misc.utils import get_user_avatar_url, get_guild_icon_url
+from .rep_ranking import RepRanking
 
 
 class ReputationHandlers:
     def __init__(self, bot: AdamBot) -> None:
         self.bot = bot
         self.ContextTypes = self.bot.ContextTypes
+        self.rankings = {}  # Links guild_id -> RepRanking
+
+    async def load_rankings(self) -> None:
+        """
+        Loads every guild's reputation points into `self.rankings`. Only current members are ranked.
+        """
+
+        async with self.bot.pool.acquire() as connection:
+            records = await connection.fetch("SELECT guild_id, member_id, reps FROM rep WHERE reps IS NOT NULL;")
+
+        guilds = {}
+        for record in records:
+            guild = self.bot.get_guild(record["guild_id"])
+            if guild and guild.get_member(record["member_id"]):
+                guilds.setdefault(record["guild_id"], []).append((record["member_id"], record["reps"]))
+        self.rankings = {guild_id: RepRanking(guild_records) for guild_id, guild_records in guilds.items()}
+
+    async def rank_member(self, member: discord.Member) -> None:
+        """
+        Puts a member who has (re)joined back on their guild's ranking
+        """
+
+        async with self.bot.pool.acquire() as connection:
+            reps = await connection.fetchval("SELECT reps FROM rep WHERE member_id = $1 AND guild_id = $2", member.id,
+                                             member.guild.id)
+        if reps is not None:
+            self.get_ranking(member.guild.id).set(member.id, reps)
+
+    def get_ranking(self, guild_id: int) -> RepRanking:
+        if guild_id not in self.rankings:
+            self.rankings[guild_id] = RepRanking()
+        return self.rankings[guild_id]
 
     async def get_leaderboard(self, ctx: commands.Context | discord.Interaction) -> None:
         """
@@ -27,18 +60,15 @@ class ReputationHandlers:
         else:
             author = ctx.user
 
-        async with self.bot.pool.acquire() as connection:
-            leaderboard = await connection.fetch(
-                "SELECT member_id, reps FROM rep WHERE guild_id = $1 ORDER BY reps DESC", ctx.guild.id)
-
-        if len(leaderboard) == 0:
+        ranking = self.get_ranking(ctx.guild.id)
+        if len(ranking) == 0:
             await self.bot.DefaultEmbedResponses.error_embed(self.bot, ctx,
                                                              f"There aren't any reputation points in {ctx.guild.name} yet! ")
             return
 
         embed = self.bot.EmbedPages(
             self.bot.PageTypes.REP,
-            leaderboard,
+            self.bot.ListPageSource(ranking),
             f"{ctx.guild.name}'s Reputation Leaderboard",
             Colour.from_rgb(177, 252, 129),
             self.bot,
@@ -59,16 +89,12 @@ class ReputationHandlers:
         """
 
         async with self.bot.pool.acquire() as connection:
-            reps = await connection.fetchval("SELECT reps FROM rep WHERE member_id = ($1) AND guild_id = $2", member.id,
-                                             member.guild.id)
-            if not reps:
-                await connection.execute("INSERT INTO rep (reps, member_id, guild_id) VALUES ($1, $2, $3)", change,
-                                         member.id, member.guild.id)
-            else:
-                await self.set_rep(member.id, member.guild.id, reps + change)
-                reps = reps + change
+            reps = await connection.fetchval(
+                "INSERT INTO rep (reps, member_id, guild_id) VALUES ($1, $2, $3) ON CONFLICT (guild_id, member_id) DO UPDATE SET reps = COALESCE(rep.reps, 0) + EXCLUDED.reps RETURNING reps",
+                change, member.id, member.guild.id)
 
-        return reps if reps else change
+        self.get_ranking(member.guild.id).set(member.id, reps)
+        return reps
 
     async def clear_rep(self, user_id: int, guild_id: int) -> None:
         """
@@ -77,26 +103,26 @@ class ReputationHandlers:
 
         async with self.bot.pool.acquire() as connection:
             await connection.execute("DELETE FROM rep WHERE member_id = ($1) AND guild_id = $2", user_id, guild_id)
+        self.get_ranking(guild_id).remove(user_id)
 
     async def set_rep(self, user_id: int, guild_id: int, reps: int) -> int:
         """
         Method to set the reputation points of a given user in a given guild.
         """
 
+        if reps == 0:
+            await self.clear_rep(user_id, guild_id)
+            return 0
+
         async with self.bot.pool.acquire() as connection:
-            if reps == 0:
-                await self.clear_rep(user_id, guild_id)
-                return 0
-            else:
-                await connection.execute("UPDATE rep SET reps = ($1) WHERE member_id = ($2) AND guild_id = $3", reps,
-                                         user_id, guild_id)
-                new_reps = await connection.fetchval("SELECT reps FROM rep WHERE member_id = ($1) AND guild_id = $2",
-                                                     user_id, guild_id)
-                if not new_reps:  # User was not already on the rep table, it needs adding
-                    await connection.execute("INSERT INTO rep (reps, member_id, guild_id) VALUES ($1, $2, $3)", reps,
-                                             user_id, guild_id)
-                    new_reps = reps
-                return new_reps
+            new_reps = await connection.fetchval(
+                "INSERT INTO rep (reps, member_id, guild_id) VALUES ($1, $2, $3) ON CONFLICT (guild_id, member_id) DO UPDATE SET reps = EXCLUDED.reps RETURNING reps",
+                reps, user_id, guild_id)
+
+        guild = self.bot.get_guild(guild_id)
+        if guild and guild.get_member(user_id):  # The ranking only holds current members, user_id may be anyone
+            self.get_ranking(guild_id).set(user_id, new_reps)
+        return new_reps
 
     async def award(self, ctx: commands.Context | discord.Interaction, args: discord.Member | discord.User | str = "",
                     member: discord.Member = "") -> None:
@@ -214,6 +240,7 @@ class ReputationHandlers:
 
         async with self.bot.pool.acquire() as connection:
             await connection.execute("DELETE from rep WHERE guild_id = $1", ctx.guild.id)
+        self.rankings.pop(ctx.guild.id, None)
 
         await self.bot.DefaultEmbedResponses.success_embed(self.bot, ctx, "Reputation reset completed!",
                                                            desc=f"All reputation points in {ctx.guild.name} have been removed")
@@ -332,23 +359,9 @@ class ReputationHandlers:
                 await self.bot.DefaultEmbedResponses.error_embed(self.bot, ctx, "We could not find that user!")
                 return
 
-        rep = None
-        lb_pos = None
-        async with self.bot.pool.acquire() as connection:
-            all_rep = await connection.fetch("SELECT member_id, reps FROM rep WHERE guild_id = $1 ORDER by reps DESC;",
-                                             ctx.guild.id)
-            all_rep = [x for x in all_rep if ctx.channel.guild.get_member(x[0]) is not None]
-            member_record = next((x for x in all_rep if x[0] == user.id), None)
-            if member_record:  # If the user actually has reps
-                rep = member_record[1]  # Check member ID and then get reps
-                prev = 0
-                lb_pos = 0
-                for record in all_rep:
-                    if record[1] != prev:
-                        lb_pos += 1
-                        prev = record[1]  # Else, increase the rank
-                    if record[0] == user.id:
-                        break  # End loop if reached the user
+        ranking = self.get_ranking(ctx.guild.id)
+        rep = ranking.reps.get(user.id)
+        lb_pos = ranking.rank(user.id)  # Members with the same reps share a position
 
         if not rep:
             rep = 0
@@ -118,7 +118,7 @@ class SupportHandlers:
                 # Start a new connection
                 try:  # Try clause gets a valid guild_id
                     guild_id = int(message.content.split(" ")[2])
-                    if guild_id not in [g.id for g in self.bot.guilds]:
+                    if not self.bot.get_guild(guild_id):
                         await message.author.send(
                             f"That is not a guild I know of, to get a list of guilds type `support start`")
                         return
@@ -127,7 +127,7 @@ class SupportHandlers:
                         f"That is not a guild I know of, to get a list of guilds type `support start`")
                     return
                 except IndexError:
-                    shared_guilds = [g for g in self.bot.guilds if message.author in g.members]
+                    shared_guilds = self.bot.get_mutual_guilds(message.author.id)
                     output = f"To start a ticket, you must run this command with a guild ID, e.g. `support start 1234567890`. Guild IDs of servers that we share are:\n"
                     for i in range(len(shared_guilds)):
                         guild = shared_guilds[i]
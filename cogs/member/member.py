@@ -15,6 +15,7 @@ class Member(commands.Cog):
 
         self.bot = bot
         self.Handlers = member_handlers.MemberHandlers(bot)
+        self.bot.shutdown_hooks.append(self.Handlers.flush_bruhs)  # don't lose bruhs that haven't been written yet
 
     @commands.Cog.listener()
     async def on_ready(self) -> None:
@@ -30,7 +31,8 @@ class Member(commands.Cog):
                                                     "channel_id": "bigint",
                                                     "guild_id": "bigint",
                                                     "reason": "varchar(255)"
-                                                }
+                                                },
+                                                concurrency=5
         )
 
     # -----------------------QUOTE------------------------------
@@ -72,9 +74,8 @@ class Member(commands.Cog):
         if type(message.channel) == discord.DMChannel or message.author.bot:
             return
 
-        if "bruh" in message.content.lower() and not message.author.bot and True not in [message.content.startswith(prefix) for prefix in await self.bot.get_used_prefixes(message)]:  # fix prefix detection
-            async with self.bot.pool.acquire() as connection:
-                await connection.execute("UPDATE config SET bruhs=bruhs + 1 WHERE guild_id=($1)", message.guild.id)
+        if "bruh" in message.content.lower() and not message.content.startswith(tuple(await self.bot.get_used_prefixes(message))):  # fix prefix detection
+            self.Handlers.count_bruh(message.guild.id)
         return
 
     @commands.command(aliases=["bruh"])
@@ -1,3 +1,4 @@
+import asyncio
 import re
 from datetime import datetime, timedelta
 
@@ -9,9 +10,54 @@ from libs.misc.utils import get_user_avatar_url, get_guild_icon_url
 
 
 class MemberHandlers:
+    BRUH_FLUSH_INTERVAL = 30  # seconds between writing the counted bruhs to the DB
+
     def __init__(self, bot) -> None:
         self.bot = bot
         self.ContextTypes = self.bot.ContextTypes
+        self.bruh_totals = None  # Links guild_id -> bruhs in the DB, loaded the first time they're asked for
+        self.bruh_deltas = {}  # Links guild_id -> bruhs counted but not written to the DB yet
+        self.bruh_flush_task = None
+
+    def count_bruh(self, guild_id: int) -> None:
+        """
+        Counts a bruh in memory, they're written to the DB in bulk every BRUH_FLUSH_INTERVAL seconds
+        """
+
+        self.bruh_deltas[guild_id] = self.bruh_deltas.get(guild_id, 0) + 1
+        if not self.bruh_flush_task:
+            self.bruh_flush_task = self.bot.loop.create_task(self.delayed_bruh_flush())
+
+    async def delayed_bruh_flush(self) -> None:
+        await asyncio.sleep(self.BRUH_FLUSH_INTERVAL)
+        self.bruh_flush_task = None
+        try:
+            await self.flush_bruhs()
+        except Exception as e:
+            print(f"{type(e).__name__}: {e}")  # counts are kept and written next time
+
+    async def flush_bruhs(self) -> None:
+        """
+        Writes every guild's counted bruhs in one UPDATE. If that fails they're kept to be written next time.
+        """
+
+        deltas, self.bruh_deltas = self.bruh_deltas, {}
+        if not deltas:
+            return
+
+        try:
+            async with self.bot.pool.acquire() as connection:
+                await connection.execute(
+                    "UPDATE config SET bruhs = COALESCE(config.bruhs, 0) + deltas.n FROM unnest($1::bigint[], $2::int[]) AS deltas (guild_id, n) WHERE config.guild_id = deltas.guild_id",
+                    list(deltas), list(deltas.values()))
+        except Exception:
+            for guild_id, n in deltas.items():
+                self.bruh_deltas[guild_id] = self.bruh_deltas.get(guild_id, 0) + n
+            raise
+
+        if self.bruh_totals is not None:
+            for guild_id, n in deltas.items():
+                self.bruh_totals[guild_id] = self.bruh_totals.get(guild_id, 0) + n
 
     async def quote(self, ctx: commands.Context | discord.Interaction, messageid: int | str,
                     channel: int | discord.TextChannel | discord.Thread | app_commands.AppCommandThread) -> None:
@@ -72,9 +118,13 @@ class MemberHandlers:
         Handler for the commands to see how many "bruhs" a specified guild has had
         """
 
-        async with self.bot.pool.acquire() as connection:
-            global_bruhs = await connection.fetchval("SELECT SUM(bruhs) FROM config;")
-            guild_bruhs = await connection.fetchval("SELECT bruhs FROM config WHERE guild_id=($1)", guild.id)
+        if self.bruh_totals is None:
+            async with self.bot.pool.acquire() as connection:
+                records = await connection.fetch("SELECT guild_id, bruhs FROM config;")
+            self.bruh_totals = {record["guild_id"]: record["bruhs"] or 0 for record in records}
+
+        global_bruhs = sum(self.bruh_totals.values()) + sum(self.bruh_deltas.values())
+        guild_bruhs = self.bruh_totals.get(guild.id, 0) + self.bruh_deltas.get(guild.id, 0)
 
         return f"•**Global** bruh moments: **{global_bruhs}**\n•**{guild.name}** bruh moments: **{guild_bruhs}**"
 
@@ -23,6 +23,7 @@ class Config(commands.Cog):
         self.bot.register_config_key = self.Handlers.register_config_key
         self.bot.is_staff = self.Handlers.is_staff  # is_staff defined here
         self.bot.get_config_key = self.Handlers.get_config_key
+        self.bot.shutdown_hooks.append(self.Handlers.flush_configs)  # don't lose edits still waiting to be written
         self.CONFIG = {
             # Stores each column of the config table, the type of validation it is, and a short description of how its used - the embed follows the same order as this
             "staff_role": [self.Handlers.Validation.Role, "The role that designates bot perms"],  # CORE
@@ -46,8 +47,8 @@ class Config(commands.Cog):
         await self.Handlers.add_config(guild.id)
 
         # General configuration workflow:
-        # 1) Make any edits directly to bot.configs[guild.id]
-        # 2) Call bot.propagate_config(guild.id) which propagates any edits to the DB
+        # 1) Make edits with bot.update_config (or Handlers.set_config_key), which changes bot.configs[guild.id]
+        # 2) The changed keys are written to the DB shortly after, bursts of edits are written together
 
     # COMMANDS
     @commands.command()
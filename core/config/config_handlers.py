@@ -1,3 +1,4 @@
+import asyncio
 import copy
 from enum import Enum
 from typing import Any
@@ -23,10 +24,17 @@ def get_validator(value) -> int:
 
 
 class ConfigHandlers:
+    FLUSH_DELAY = 2  # seconds to wait for more changes before writing them to the DB
+    MAX_FLUSH_BACKOFF = 300  # longest wait, in seconds, between attempts to write changes while the DB is failing
+
     def __init__(self, bot: AdamBot, cog: commands.Cog) -> None:
         self.bot = bot
         self.cog = cog
         self.Validation = Validation
+        self.columns = set()  # columns the config table is known to have
+        self.dirty = {}  # guild_id -> keys changed in self.bot.configs but not written to the DB yet
+        self.flush_task = None
+        self.flush_failures = 0  # failed writes in a row, for backing off retries
 
     async def is_staff(self, ctx: commands.Context | discord.Interaction) -> None | bool:
         """
@@ -55,10 +63,60 @@ class ConfigHandlers:
         if [type(a) for a in [name, validator_type, description]] == [str, Validation, str]:
             self.cog.CONFIG[name] = [validator_type, description]
 
+    async def load_columns(self) -> None:
+        """
+        Fetches the columns the config table has, so that writes know which ones need creating without asking the DB
+        """
+
+        async with self.bot.pool.acquire() as connection:
+            current_columns = await connection.fetch(
+                "SELECT column_name FROM information_schema.columns WHERE table_schema = current_schema() AND table_name = 'config'")
+        self.columns = {column["column_name"] for column in current_columns}
+
     async def add_all_guild_configs(self) -> None:
         """Adds configs to all guilds - executed on startup"""
-        for guild in self.bot.guilds:
-            await self.add_config(guild.id)
+        await self.load_columns()
+        await self.add_configs([guild.id for guild in self.bot.guilds])
+
+    def make_configs(self, records: list[asyncpg.Record]) -> None:
+        """
+        Turns config records into dictionaries in self.bot.configs (column name = key, value = value). Columns that
+        aren't config keys (phantom keys) are left out, and config keys without a column yet are None.
+        """
+
+        if not records:
+            return
+
+        columns = [key for key in records[0].keys() if key in self.cog.CONFIG]  # every record has the same columns
+        missing = [key for key in self.cog.CONFIG if key not in columns]
+        for record in records:
+            config = {key: record[key] for key in columns}
+            config.update(dict.fromkeys(missing))
+            self.bot.configs[record["guild_id"]] = config
+
+    async def add_configs(self, guild_ids: list[int]) -> None:
+        """
+        Method that gets the configuration for many guilds at once and puts it into self.bot.configs. Guilds without
+        a record get a new, blank one.
+
+        The missing records are inserted and every record is fetched in the same round-trip.
+        """
+
+        guild_ids = [guild_id for guild_id in guild_ids if guild_id not in self.bot.configs]  # any updates are made directly to self.bot.configs (before DB propagation) so these don't need refetching
+        if not guild_ids:
+            return
+
+        async with self.bot.pool.acquire() as connection:
+            records = await connection.fetch("""
+                WITH new AS (
+                    INSERT INTO config (guild_id) SELECT unnest($1::bigint[]) ON CONFLICT (guild_id) DO NOTHING RETURNING *
+                )
+                SELECT * FROM config WHERE guild_id = ANY($1::bigint[])
+                UNION ALL
+                SELECT * FROM new
+            """, guild_ids)  # rows inserted by the CTE aren't visible to the SELECT on config, hence the UNION
+
+        self.make_configs(records)
 
     async def add_config(self, guild_id: int) -> None:
         """
@@ -66,41 +124,36 @@ class ConfigHandlers:
         is stored in the `config` table. If no configuration is found, a new record is made and a blank configuration dict.
         """
 
-        if guild_id not in self.bot.configs:  # This check (to see if a DB call is needed) is okay because any updates made will be directly made to self.bot.configs (before DB propagation) TODO: Perhaps limit number of items in this
-            async with self.bot.pool.acquire() as connection:
-                record = await connection.fetchrow("SELECT * FROM config WHERE guild_id = $1;", guild_id)
-                if not record:
-                    try:
-                        await connection.execute("INSERT INTO config (guild_id) VALUES ($1);", guild_id)
-                    except asyncpg.exceptions.UniqueViolationError:  # config already exists
-                        pass
-                    finally:
-                        record = await connection.fetchrow("SELECT * FROM config WHERE guild_id = $1;",
-                                                           guild_id)  # Fetch configuration record
-
-            keys = list(record.keys())[1:]
-            values = list(record.values())[1:]  # Include all keys and values apart from the first one (guild_id)
-
-            i = 0
-            while i < len(keys):  # remove phantom keys
-                if keys[i] not in self.cog.CONFIG.keys():
-                    del keys[i]
-                    del values[i]
-                    i -= 1
-                i += 1
-
-            for key in self.cog.CONFIG:
-                if key not in keys:
-                    keys.append(key)
-                    values.append(None)
-
-            self.bot.configs[guild_id] = dict(
-                zip(keys, values))  # Turns the record into a dictionary (column name = key, value = value)
+        await self.add_configs([guild_id])
 
     async def update_config(self, ctx: commands.Context, key: str, value: str) -> None:
         if ctx.guild.id in self.bot.configs:
-            self.bot.configs[ctx.guild.id][key] = value
-            await self.propagate_config(ctx.guild.id)
+            self.set_config_key(ctx.guild.id, key, value)
+
+    def set_config_key(self, guild_id: int, key: str, value: Any) -> None:
+        """
+        Changes a key in a guild's cached config and schedules the change to be written to the DB.
+
+        Changes made within FLUSH_DELAY seconds of each other are written together. Cogs are told about the change
+        through the `config_update` event.
+        """
+
+        self.bot.configs[guild_id][key] = value
+        self.dirty.setdefault(guild_id, set()).add(key)
+        self.bot.dispatch("config_update", guild_id, key, value)  # lets cogs drop anything they've derived from the config
+        self.schedule_flush(self.FLUSH_DELAY)
+
+    def schedule_flush(self, delay: float) -> None:
+        """
+        Starts a flush in `delay` seconds, unless one is already waiting to go
+        """
+
+        if self.flush_task is None or self.flush_task.done() or self.flush_task is asyncio.current_task():
+            self.flush_task = self.bot.loop.create_task(self.delayed_flush(delay))
+
+    async def delayed_flush(self, delay: float) -> None:
+        await asyncio.sleep(delay)
+        await self.flush_configs()
 
     async def get_config_key(self, ctx: commands.Context | discord.Guild | int, key: str) -> Any:
         if isinstance(ctx, discord.Guild):
@@ -111,52 +164,72 @@ class ConfigHandlers:
             ctx_id = ctx
         return self.bot.configs.get(ctx_id, {}).get(key, None)
 
+    async def add_columns(self, keys: set[str]) -> None:
+        """
+        Creates columns for config keys that have never been stored before
+        """
+
+        async with self.bot.pool.acquire() as connection:
+            for key in keys - self.columns:
+                validator = self.cog.CONFIG.get(key)[0]
+                if validator in [Validation.Role, Validation.Channel, Validation.Integer]:
+                    await connection.execute(f"ALTER TABLE config ADD COLUMN IF NOT EXISTS {key} BIGINT")
+                elif validator == Validation.Boolean:
+                    await connection.execute(f"ALTER TABLE config ADD COLUMN IF NOT EXISTS {key} BOOLEAN DEFAULT false")
+                else:
+                    await connection.execute(f"ALTER TABLE config ADD COLUMN IF NOT EXISTS {key} VARCHAR(1023)")
+                self.columns.add(key)
+
+    async def flush_configs(self) -> None:
+        """
+        Writes every changed config key to the DB. Guilds that changed the same set of keys share one statement.
+        """
+
+        dirty, self.dirty = self.dirty, {}
+        batches = {}  # frozenset of keys -> [guild_id, *values] rows
+        new_columns = set()
+        for guild_id, keys in dirty.items():
+            data = self.bot.configs.get(guild_id)
+            if data is None:
+                continue
+            keys = frozenset(key for key in keys if key in self.columns or data.get(key) is not None)  # no point creating a column just to store NULL
+            if not keys:
+                continue
+            new_columns |= {key for key in keys if key not in self.columns}
+            batches.setdefault(keys, []).append(guild_id)
+
+        try:
+            if new_columns:
+                await self.add_columns(new_columns)
+
+            async with self.bot.pool.acquire() as connection:
+                for keys, guild_ids in batches.items():
+                    keys = sorted(keys)
+                    sql = f"INSERT INTO config (guild_id, {', '.join(keys)}) VALUES ($1, {', '.join(f'${i + 2}' for i in range(len(keys)))}) " \
+                          f"ON CONFLICT (guild_id) DO UPDATE SET {', '.join(f'{key} = EXCLUDED.{key}' for key in keys)}"
+                    await connection.executemany(sql, [[guild_id] + [self.bot.configs[guild_id][key] for key in keys] for guild_id in guild_ids])
+        except Exception as e:
+            self.flush_failures += 1
+            delay = min(self.FLUSH_DELAY * 2 ** self.flush_failures, self.MAX_FLUSH_BACKOFF)
+            print(f"{type(e).__name__}: {e}\nThe above occurred when writing configs, will retry in {delay} seconds")
+            for guild_id, keys in dirty.items():
+                self.dirty.setdefault(guild_id, set()).update(keys)
+        else:
+            self.flush_failures = 0
+            delay = self.FLUSH_DELAY
+
+        if self.dirty:  # changed while this flush was writing, or failed to write
+            self.schedule_flush(delay)
+
     async def propagate_config(self, guild_id: int) -> None:
         """
-        Method that sends the config data stored in self.bot.configs and propagates them to the DB.
+        Method that writes any pending changes to self.bot.configs to the DB straight away, rather than waiting for the
+        scheduled flush.
         Should only be called internally ideally.
         """
 
-        async with self.bot.pool.acquire() as connection:
-            current_columns = await connection.fetch(
-                "SELECT column_name FROM information_schema.columns WHERE table_name = 'config'")
-            current_columns = [column["column_name"] for column in current_columns]
-
-        data = self.bot.configs[guild_id]
-        new_data = {}
-        for j in data:
-            if data.get(j):
-                new_data[j] = data[j]
-
-        data = new_data
-        length = len(data.keys())
-
-        # Make SQL
-        sql_part = ""
-        keys = list(data)  # List of the keys (current column names in the database)
-        counter = 0
-        for i in range(length):
-            column_exists = keys[i] in list(current_columns)
-            if data.get(keys[i], None):
-                if not column_exists:  # create new columns when data needs to be stored
-                    async with self.bot.pool.acquire() as connection:
-                        validator = self.cog.CONFIG.get(keys[i])[0]
-                        if validator in [Validation.Role, Validation.Channel, Validation.Integer]:
-                            await connection.execute(f"ALTER TABLE config ADD {keys[i]} BIGINT")
-                        elif validator == Validation.Boolean:
-                            await connection.execute(f"ALTER TABLE config ADD {keys[i]} BOOLEAN DEFAULT false")
-                        else:
-                            await connection.execute(f"ALTER TABLE config ADD {keys[i]} VARCHAR(1023)")
-
-            if data.get(keys[i], None) or not data.get(keys[i],
-                                                       None) and column_exists:  # need to update table if column exists as there was already data
-                sql_part += f"{keys[i]} = (${counter + 1}),"  # For each key, add "{nth key_name} = $n+1"
-
-                counter += 1
-
-        sql = f"UPDATE config SET {sql_part[:-1]} WHERE guild_id = {guild_id};"
-        async with self.bot.pool.acquire() as connection:
-            await connection.execute(sql, *data.values())
+        if guild_id in self.dirty:
+            await self.flush_configs()
 
     async def what_prefixes(self, ctx: commands.Context | discord.Interaction) -> None:
         ctx_type = get_context_type(ctx)
@@ -316,13 +389,11 @@ class ConfigHandlers:
 
         # At this point, the input is valid and can be changed
         if validation_type == Validation.Channel or validation_type == Validation.Role:
-            self.bot.configs[ctx.guild.id][key] = value.id
-            await self.propagate_config(ctx.guild.id)
+            self.set_config_key(ctx.guild.id, key, value.id)
             await self.bot.DefaultEmbedResponses.success_embed(self.bot, ctx, f"{key} has been updated!",
                                                                f"It has been changed to '{value.mention}'")  # Value is either a TextChannel, Thread or Role
         else:
-            self.bot.configs[ctx.guild.id][key] = value
-            await self.propagate_config(ctx.guild.id)
+            self.set_config_key(ctx.guild.id, key, value)
             await self.bot.DefaultEmbedResponses.success_embed(self.bot, ctx, f"{key} has been updated!",
                                                                f"It has been changed to '{value}'")
 
@@ -346,8 +417,7 @@ class ConfigHandlers:
             await self.bot.DefaultEmbedResponses.error_embed(self.bot, ctx, "That is not a valid configuration option!")
             return
 
-        self.bot.configs[ctx.guild.id][key] = None
-        await self.propagate_config(ctx.guild.id)
+        self.set_config_key(ctx.guild.id, key, None)
         await self.bot.DefaultEmbedResponses.success_embed(self.bot, ctx, f"{key} has been updated!",
                                                            "It has been changed to ***N/A***")
 
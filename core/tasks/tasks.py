@@ -1,5 +1,9 @@
 import asyncio
 import datetime
+import heapq
+import os
+import socket
+import time
 from typing import Callable
 
 import asyncpg
@@ -7,38 +11,82 @@ from discord.ext import commands
 
 
 class Tasks(commands.Cog):
+    NOTIFY_CHANNEL = "tasks"
+    LEASE_SECONDS = 300  # how long a claimed task is reserved for this process before another one may take it over, counted again from when its handler starts
+    MAX_ATTEMPTS = 5  # failures before a task is dead-lettered
+    RETRY_BACKOFF = 30  # seconds before the first retry, doubled for every failure after that
+    LEASE_COLUMNS = {
+        "claimed_by": "varchar(255)",
+        "claimed_until": "timestamptz",
+        "attempts": "int DEFAULT 0",
+        "dead_letter": "boolean DEFAULT false"
+    }
+
     def __init__(self, bot) -> None:
         self.bot = bot
         self.task_types = {}
+        self.queue = []  # min-heap of (due timestamp, task id)
+        self.queued_ids = set()
+        self.in_flight = set()  # ids of tasks being handled, so a rebuild of the queue doesn't run them twice
+        self.held = {}  # task_name -> [(due timestamp, task id)] for task types that haven't been registered yet
+        self.wakeup = asyncio.Event()
+        self.listener_connection = None  # a connection of its own rather than one of the pool's, so LISTEN never ties up a pool slot
+        self.needs_reconcile = True
+        self.running = False
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"  # what this process puts in claimed_by
+        self.global_limit = asyncio.Semaphore(self.bot.internal_config.get("task_concurrency", 10))  # shared by every task type so the Discord rate limits are respected
         self.bot.tasks = self
+        self.bot.shutdown_hooks.append(self.close_listener)
 
     @commands.Cog.listener()
     async def on_ready(self) -> None:
         while not self.bot.online:
             await asyncio.sleep(1)  # wait else DB won't be available
 
-        await self.execute_tasks()
+        if self.running:
+            return  # on_ready fires again on reconnects, the scheduler is already going
+        self.running = True
 
-    async def register_task_type(self, task_name: str, handling_method: Callable, delete_task: bool = True, needs_extra_columns=None) -> None:  # expose to bot object
-        if needs_extra_columns is None:
-            needs_extra_columns = {"member_id": "bigint", "guild_id": "bigint"}
-        while not self.bot.online:
-            await asyncio.sleep(1)  # wait else DB won't be available
+        if await self.add_task_columns(self.LEASE_COLUMNS):
+            await self.execute_tasks()
+
+    async def add_task_columns(self, columns: dict) -> bool:
+        """
+        Adds any of `columns` (name -> type) that the tasks table doesn't have yet. Returns whether it succeeded.
+        """
 
         async with self.bot.pool.acquire() as connection:
             try:
-                for column in needs_extra_columns:
-                    await connection.execute(f"ALTER TABLE tasks ADD COLUMN IF NOT EXISTS {column} {needs_extra_columns[column]}")
+                for column in columns:
+                    await connection.execute(f"ALTER TABLE tasks ADD COLUMN IF NOT EXISTS {column} {columns[column]}")
             except Exception as e:
                 print(e)
-                return
+                return False
+        return True
+
+    async def register_task_type(self, task_name: str, handling_method: Callable, delete_task: bool = True, needs_extra_columns=None, concurrency: int = 1) -> None:  # expose to bot object
+        """
+        Registers a handler for tasks called `task_name`. At most `concurrency` tasks of this type are handled at once.
+        """
+
+        if needs_extra_columns is None:
+            needs_extra_columns = {"member_id": "bigint", "guild_id": "bigint"}
+        while not self.bot.online:
+            await asyncio.sleep(1)  # wait else DB won't be available
+
+        if not await self.add_task_columns(needs_extra_columns):
+            return
 
         self.task_types[task_name] = {
             "handler": handling_method,
             "delete_post_handle": delete_task,
-            "extra_data": needs_extra_columns
+            "extra_data": needs_extra_columns,
+            "workers": asyncio.Semaphore(max(1, concurrency))
         }
 
+        for due, task_id in self.held.pop(task_name, []):  # anything that came due before the handler existed
+            self.schedule(task_id, due)
+
     async def submit_task(self, task_name: str, timestamp: str | datetime.datetime, extra_columns: dict) -> None:
         while not self.bot.online:
             await asyncio.sleep(1)  # wait else DB won't be available
@@ -48,39 +96,256 @@ class Tasks(commands.Cog):
 
         async with self.bot.pool.acquire() as connection:
             try:
-                await connection.execute(f"INSERT INTO tasks (task_name, task_time, {', '.join(extra_columns)}) values ($1, $2, {''.join([f', ${i+3}' for i in range(len(extra_columns))])[2:]})", task_name, timestamp, *extra_columns.values())
+                task = await connection.fetchrow(f"INSERT INTO tasks (task_name, task_time, {', '.join(extra_columns)}) values ($1, $2, {''.join([f', ${i+3}' for i in range(len(extra_columns))])[2:]}) RETURNING id, task_time", task_name, timestamp, *extra_columns.values())
+                due = self.to_timestamp(task["task_time"])
+                await self.notify(connection, task["id"], due)
             except Exception as e:
                 raise e
 
+        self.schedule(task["id"], due)
+
+    async def notify(self, connection: asyncpg.Connection, task_id: int, due: float) -> None:
+        """
+        Tells every bot process listening on the tasks table (including this one) when a task is next due.
+        """
+
+        await connection.execute("SELECT pg_notify($1, $2)", self.NOTIFY_CHANNEL, f"{task_id} {due}")
+
+    @staticmethod
+    def to_timestamp(task_time: str | datetime.datetime | None) -> float:
+        """
+        Turns a task time into a POSIX timestamp. Naive times are treated as UTC, as they are by asyncpg.
+        """
+
+        if task_time is None:
+            return 0.0  # e.g. a claimed_until that was never set
+        if type(task_time) is str:
+            task_time = datetime.datetime.fromisoformat(task_time)
+        if task_time.tzinfo is None:
+            task_time = task_time.replace(tzinfo=datetime.timezone.utc)
+        return task_time.timestamp()
+
+    def schedule(self, task_id: int, due: float) -> None:
+        """
+        Adds a task to the in-memory queue and wakes the scheduler if the task is now the earliest one.
+        """
+
+        if task_id in self.queued_ids:
+            return
+        self.queued_ids.add(task_id)
+        heapq.heappush(self.queue, (due, task_id))
+        if self.queue[0][1] == task_id:
+            self.wakeup.set()
+
+    def pop_due(self) -> list[int]:
+        now = time.time()
+        due = []
+        while self.queue and self.queue[0][0] <= now:
+            task_id = heapq.heappop(self.queue)[1]
+            self.queued_ids.discard(task_id)
+            due.append(task_id)
+        return due
+
+    def on_notify(self, connection: asyncpg.Connection, pid: int, channel: str, payload: str) -> None:
+        """
+        Called when any bot process (including this one) submits or reschedules a task.
+        """
+
+        try:
+            task_id, due = payload.split(" ")
+            self.schedule(int(task_id), float(due))
+        except ValueError:
+            print(f"Ignoring malformed task notification {payload}")
+
+    def on_listener_terminated(self, connection: asyncpg.Connection) -> None:
+        """
+        Notifications sent while the listener was down are lost, so the queue has to be rebuilt from the DB.
+        """
+
+        self.needs_reconcile = True
+        self.wakeup.set()
+
+    async def listen(self) -> None:
+        if self.listener_connection is not None and not self.listener_connection.is_closed():
+            return
+
+        await self.close_listener()
+        self.listener_connection = await asyncpg.connect(self.bot.db_url + "?sslmode=require")
+        self.listener_connection.add_termination_listener(self.on_listener_terminated)
+        await self.listener_connection.add_listener(self.NOTIFY_CHANNEL, self.on_notify)
+
+    async def close_listener(self) -> None:
+        if self.listener_connection is not None:
+            self.listener_connection.terminate()
+            self.listener_connection = None
+
+    async def reconcile(self) -> None:
+        """
+        Fills in the in-memory queue from the tasks table. Done at startup and after the DB connection drops.
+
+        The rows are added to the existing queue rather than replacing it, so tasks scheduled while the scan was
+        running are kept.
+        """
+
+        await self.listen()  # listen first so nothing submitted during the scan slips through
+        async with self.bot.pool.acquire() as connection:
+            tasks = await connection.fetch("SELECT id, GREATEST(task_time, claimed_until) AS task_time FROM tasks WHERE NOT dead_letter AND task_time IS NOT NULL")
+
+        self.held = {}  # the scan covers these too, claim() holds them again if their type still isn't registered
+        for task in tasks:
+            if task["id"] not in self.in_flight:
+                self.schedule(task["id"], self.to_timestamp(task["task_time"]))
+        self.needs_reconcile = False
+
+    async def run_task(self, task: dict, skipped: set) -> Exception | None:
+        """
+        Runs a single task's handler within its task type's worker limit and the global limit. If the task's lease
+        can't be renewed once a worker is free, the handler isn't run and the task's id is added to `skipped`.
+
+        Returns the exception the handler raised, if any.
+        """
+
+        task_type = self.task_types[task["task_name"]]
+        async with task_type["workers"], self.global_limit:
+            if not await self.renew_lease(task["id"]):
+                # Another process may have taken the task over while it waited for a worker, so leave its row be
+                # and check on it again once any lease this process still has would have run out
+                skipped.add(task["id"])
+                self.schedule(task["id"], time.time() + self.LEASE_SECONDS)
+                return
+            try:
+                await task_type["handler"](task)
+            except Exception as e:
+                print(f"{type(e).__name__}: {e}")
+                return e
+
+    async def renew_lease(self, task_id: int) -> bool:
+        """
+        Restarts this process's lease on a task just before its handler runs, since the task may have waited behind
+        the worker limits for a long time after it was claimed. Returns whether the lease is still held.
+        """
+
+        try:
+            async with self.bot.pool.acquire() as connection:
+                renewed = await connection.fetchval(
+                    "UPDATE tasks SET claimed_until = now() + make_interval(secs => $3) WHERE id = $1 AND claimed_by = $2 RETURNING id",
+                    task_id, self.worker_id, self.LEASE_SECONDS)
+        except (OSError, asyncpg.exceptions.ConnectionDoesNotExistError, asyncpg.exceptions.InterfaceError):
+            return False
+        return renewed is not None
+
+    async def retry_later(self, connection: asyncpg.Connection, task: dict) -> None:
+        """
+        Releases a failed task so it's tried again after an exponential backoff, or dead-letters it once it has failed
+        MAX_ATTEMPTS times. Dead-lettered tasks are kept in the table but never run again.
+        """
+
+        attempts = (task["attempts"] or 0) + 1
+        if attempts >= self.MAX_ATTEMPTS:
+            print(f"Task {task['id']} ({task['task_name']}) failed {attempts} times, dead-lettering it")
+            await connection.execute("UPDATE tasks SET attempts = $2, dead_letter = true, claimed_by = NULL, claimed_until = NULL WHERE id = $1", task["id"], attempts)
+            return
+
+        due = time.time() + self.RETRY_BACKOFF * 2 ** (attempts - 1)
+        await connection.execute("UPDATE tasks SET attempts = $2, task_time = $3, claimed_by = NULL, claimed_until = NULL WHERE id = $1",
+                                 task["id"], attempts, datetime.datetime.fromtimestamp(due, tz=datetime.timezone.utc))
+        await self.notify(connection, task["id"], due)
+
+    async def run_tasks(self, tasks: list[dict]) -> None:
+        """
+        Runs a batch of claimed tasks concurrently, then deletes the finished ones in one go.
+        """
+
+        ids = {task["id"] for task in tasks}
+        self.in_flight |= ids
+        skipped = set()
+        try:
+            errors = await asyncio.gather(*[self.run_task(task, skipped) for task in tasks])
+            ran = [(task, error) for task, error in zip(tasks, errors) if task["id"] not in skipped]
+            finished = [task["id"] for task, error in ran if not error and self.task_types[task["task_name"]]["delete_post_handle"]]
+            kept = [task["id"] for task, error in ran if not error and task["id"] not in finished]
+            async with self.bot.pool.acquire() as connection:
+                if finished:
+                    await connection.execute("DELETE FROM tasks WHERE id = ANY($1) AND claimed_by = $2", finished, self.worker_id)
+                if kept:
+                    await connection.execute("UPDATE tasks SET claimed_by = NULL, claimed_until = NULL WHERE id = ANY($1) AND claimed_by = $2", kept, self.worker_id)
+                for task, error in ran:
+                    if error:
+                        await self.retry_later(connection, task)
+        except (OSError, asyncpg.exceptions.ConnectionDoesNotExistError, asyncpg.exceptions.InterfaceError) as e:
+            print(f"Could not update finished tasks {ids}, their leases will expire\n{type(e).__name__}: {e}")
+        finally:
+            self.in_flight -= ids
+
+    async def claim(self, connection: asyncpg.Connection, due: list[int]) -> list[dict]:
+        """
+        Leases as many of the `due` tasks as possible to this process. Rows another process is holding are skipped
+        rather than waited on, and go back in the queue for when their lease runs out.
+        """
+
+        async with connection.transaction():
+            claimed = await connection.fetch(
+                """UPDATE tasks SET claimed_by = $1, claimed_until = now() + make_interval(secs => $2)
+                   WHERE id IN (
+                       SELECT id FROM tasks
+                       WHERE id = ANY($3) AND task_name = ANY($4) AND NOT dead_letter AND task_time <= now() + interval '1 second'
+                       AND (claimed_until IS NULL OR claimed_until < now())
+                       FOR UPDATE SKIP LOCKED
+                   )
+                   RETURNING *""", self.worker_id, self.LEASE_SECONDS, due, list(self.task_types))
+        claimed = [dict(task) for task in claimed]
+
+        claimed_ids = {task["id"] for task in claimed}
+        leftover = [task_id for task_id in due if task_id not in claimed_ids]
+        if leftover:
+            tasks = await connection.fetch("SELECT id, task_name, task_time, claimed_until FROM tasks WHERE id = ANY($1) AND NOT dead_letter AND task_time IS NOT NULL", leftover)
+            for task in tasks:
+                due_at = max(self.to_timestamp(task["task_time"]), self.to_timestamp(task["claimed_until"]), time.time() + 1)
+                if task["task_name"] not in self.task_types:
+                    self.held.setdefault(task["task_name"], []).append((due_at, task["id"]))  # task_type hasn't been registered yet, hold task
+                else:
+                    self.schedule(task["id"], due_at)
+
+        return claimed
+
     async def execute_tasks(self) -> None:
         """
-        The loop that continually checks the DB for todos.
+        The loop that sleeps until the next task is due, then runs every task that is due.
             The todo table looks like:
                 id SERIAL PRIMARY KEY,
                 task_name VARCHAR(255),
                 task_time timestamptz,
                 member_id bigint,
                 guild_id bigint
+
+        The queue only holds (due time, id) pairs, the rows themselves are claimed when they come due. Tasks deleted
+        directly from the DB in the meantime simply aren't found, and tasks claimed by another bot process sharing
+        the table are left to it. Claims are leases, so if that process dies the task is picked up once it expires.
         """
 
         while self.bot.online:
             try:
+                if self.needs_reconcile:
+                    await self.reconcile()
+
+                self.wakeup.clear()
+                due = self.pop_due()
+                if not due:
+                    timeout = self.queue[0][0] - time.time() if self.queue else None
+                    try:
+                        await asyncio.wait_for(self.wakeup.wait(), timeout=timeout)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
                 async with self.bot.pool.acquire() as connection:
-                    tasks = await connection.fetch("SELECT * FROM tasks WHERE task_time <= ($1)", datetime.datetime.utcnow())
-                    for task in tasks:
-                        task = dict(task)
-                        try:
-                            if task["task_name"] not in self.task_types:
-                                continue  # task_type hasn't been registered yet, hold task
-                            await self.task_types[task["task_name"]]["handler"](task)
-                        except Exception as e:
-                            print(f"{type(e).__name__}: {e}")
-                        if self.task_types[task["task_name"]]["delete_post_handle"]:
-                            await connection.execute("DELETE FROM tasks WHERE id = ($1)", task["id"])
-            except (OSError, asyncpg.exceptions.ConnectionDoesNotExistError):
-                await asyncio.sleep(1)  # workaround for task crashing when connection temporarily drops with db
+                    tasks = await self.claim(connection, due)
 
-            await asyncio.sleep(1)
+                if tasks:
+                    self.bot.loop.create_task(self.run_tasks(tasks))  # don't hold up tasks that come due while these run
+            except (OSError, asyncpg.exceptions.ConnectionDoesNotExistError, asyncpg.exceptions.InterfaceError):
+                self.needs_reconcile = True
+                await asyncio.sleep(1)  # workaround for task crashing when connection temporarily drops with db
 
 
 async def setup(bot) -> None:
@@ -1,6 +1,18 @@
+import hashlib
+import json
+
 import asyncpg
 
 
+async def init_connection(connection: asyncpg.Connection) -> None:
+    """
+    Run on every new pool connection. Makes JSON/JSONB columns come back as Python objects rather than strings.
+    """
+
+    for json_type in ["json", "jsonb"]:
+        await connection.set_type_codec(json_type, encoder=json.dumps, decoder=json.loads, schema="pg_catalog")
+
+
 async def introduce_tables(pool: asyncpg.pool.Pool, table_collection: list[dict]) -> None:
     async with pool.acquire() as connection:
         for table in table_collection:
@@ -23,64 +35,222 @@ async def introduce_tables(pool: asyncpg.pool.Pool, table_collection: list[dict]
                 print(f"Something went wrong creating the table {name} with \n{a}")
 
 
-async def insert_migrate_column_if_not_exists(pool: asyncpg.pool.Pool, table_name: str, column_name: str,
-                                              column_params: str = None, rename_from: str = None,
-                                              create_if_not_exists: bool = True) -> None:
+def schema_fingerprint(table_collection: list[dict]) -> str:
+    """
+    Hash of the requested schema, used to tell whether anything has changed since the last time it was applied
+    """
+
+    return hashlib.sha256(json.dumps(table_collection, sort_keys=True).encode()).hexdigest()
+
+
+async def get_fingerprint(connection: asyncpg.Connection, name: str) -> str | None:
+    await connection.execute("""CREATE TABLE IF NOT EXISTS schema_fingerprint (
+        name VARCHAR(255) PRIMARY KEY,
+        fingerprint CHAR(64)
+    )""")
+    return await connection.fetchval("SELECT fingerprint FROM schema_fingerprint WHERE name = $1", name)
+
+
+async def set_fingerprint(connection: asyncpg.Connection, name: str, fingerprint: str) -> None:
+    await connection.execute(
+        "INSERT INTO schema_fingerprint (name, fingerprint) VALUES ($1, $2) ON CONFLICT (name) DO UPDATE SET fingerprint = EXCLUDED.fingerprint",
+        name, fingerprint)
+
+
+async def get_available_columns(connection: asyncpg.Connection, table_names: list[str]) -> dict[str, list[str]]:
+    """
+    Fetches the columns of every table in `table_names` in one query
+    """
+
+    available_columns = {name: [] for name in table_names}
+    columns = await connection.fetch(
+        "SELECT table_name, column_name FROM information_schema.columns WHERE table_schema = current_schema() AND table_name = ANY($1) ORDER BY ordinal_position",
+        table_names)
+    for column in columns:
+        available_columns[column["table_name"]].append(column["column_name"])
+    return available_columns
+
+
+def plan_column_changes(table: dict, available_columns: list[str]) -> list[str]:
+    """
+    Works out the DDL needed to bring a table's columns in line with its cog config, without touching the DB
+    """
+
+    name = table["name"]
+    renames = table.get("migrate", {})
+    columns = list(available_columns)  # updated as changes are planned so later renames see earlier ones
+    statements = []
+
+    field_names = []
+    field_cond = []
+    for field in table["fields"]:
+        field_names.append(field[:field.index(" ")])
+        field_cond.append(field[field.index(" ") + 1:])
+
+    for field_name, column_params in zip(field_names, field_cond):  # idea of this is to add new columns added to cog configs automatically without needing to do it manually
+        if field_name in columns:
+            continue
+        rename_from = renames.get(field_name, None)
+        if type(rename_from) is str and rename_from in columns:
+            print(f"Renaming column {rename_from} to {field_name} in {name}")
+            statements.append(f"ALTER TABLE {name} RENAME COLUMN {rename_from} TO {field_name}")
+            columns[columns.index(rename_from)] = field_name
+        else:
+            print(f"Adding {field_name} to {name}")
+            statements.append(f"ALTER TABLE {name} ADD {field_name} {column_params}")
+            columns.append(field_name)
+
+    for rename in renames:  # this is technically undefined behaviour since ordinarily configs shouldn't be requesting renames for columns that aren't specified but we're making use of it for config ;)
+        rename_from = renames.get(rename)
+        if rename not in field_names and rename not in columns and rename_from in columns:  # won't know types + handled by config anyway to save db space
+            print(f"Renaming column {rename_from} to {rename} in {name}")
+            statements.append(f"ALTER TABLE {name} RENAME COLUMN {rename_from} TO {rename}")
+            columns[columns.index(rename_from)] = rename
+
+    if name != "config":
+        [print(f"INFO: Phantom DB column {column} in {name}") for column in columns if
+         column not in field_names]  # don't delete in case they're still needed
+
+    return statements
+
+
+async def insert_cog_db_columns_if_not_exists(pool: asyncpg.pool.Pool, table_collection: list[dict]) -> bool:
+    """
+    Adds and renames columns so that every table matches its cog config. Returns whether the columns are up to date.
+
+    The catalog is read once for all tables, the differences are worked out in memory and all the DDL is applied in a
+    single transaction. If the schema hasn't changed since it was last applied, nothing is done at all.
+    """
+
+    if type(table_collection) is not list:
+        return False
+
+    tables = []
+    for table in table_collection:
+        if type(table) is not dict:
+            continue
+
+        name = table.get("name", None)
+        fields_params = table.get("fields", None)
+
+        if type(name) is not str or type(fields_params) is not list or len(
+                [field for field in fields_params if type(field) is not str]) > 0:
+            continue
+        tables.append(table)
+
+    fingerprint = schema_fingerprint(tables)
     try:
         async with pool.acquire() as connection:
-            available_columns = await connection.fetch(
-                f"SELECT column_name FROM information_schema.columns WHERE table_name='{table_name}'")
-            available_columns = [column["column_name"] for column in available_columns]
-
-            if column_name not in available_columns:
-                if type(rename_from) is str:
-                    print(f"Renaming column {rename_from} to {column_name} in {table_name}")
-                    await connection.execute(f"ALTER TABLE {table_name} RENAME COLUMN {rename_from} TO {column_name}")
-                elif create_if_not_exists:
-                    print(f"Adding {column_name} to {table_name}")
-                    await connection.execute(f"ALTER TABLE {table_name} ADD {column_name} {column_params}")
+            if await get_fingerprint(connection, "columns") == fingerprint:
+                return True
+
+            available_columns = await get_available_columns(connection, [table["name"] for table in tables])
+            statements = []
+            for table in tables:
+                statements += plan_column_changes(table, available_columns[table["name"]])
+
+            async with connection.transaction():
+                for statement in statements:
+                    await connection.execute(statement)
+                await set_fingerprint(connection, "columns", fingerprint)
     except Exception as e:
-        print(f"{e}\nThe above occurred when trying to insert {column_name} into {table_name}")
+        print(f"{e}\nThe above occurred when trying to migrate the columns of the cog tables")
+        return False
+    return True
 
 
-async def insert_cog_db_columns_if_not_exists(pool: asyncpg.pool.Pool, table_collection: list[dict]) -> None:
-    if type(table_collection) is not list:
-        return
+async def apply_migrations(pool: asyncpg.pool.Pool, migration_collection: list[dict],
+                           index_collection: list[dict], loaded_cogs: list[str]) -> None:
+    """
+    Applies any migrations and indexes from the cog configs that haven't been applied yet, recording them in the
+    schema_version table. Indexes that a loaded cog created but no longer declares are dropped.
+
+    Each migration is run in its own transaction, in version order per cog. Indexes are built with
+    CREATE INDEX CONCURRENTLY so the tables stay writable while they're built, which can't happen in a transaction.
+    """
 
     async with pool.acquire() as connection:
-        for table in table_collection:
-            if type(table) is not dict:
+        await connection.execute("""CREATE TABLE IF NOT EXISTS schema_version (
+            cog VARCHAR(255) NOT NULL,
+            version VARCHAR(255) NOT NULL,
+            applied_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            PRIMARY KEY (cog, version)
+        )""")
+        applied = {(record["cog"], record["version"]) for record in
+                   await connection.fetch("SELECT cog, version FROM schema_version")}
+
+        failed_cogs = []
+        for migration in sorted(migration_collection, key=lambda m: (m["cog"], m["version"])):
+            if (migration["cog"], str(migration["version"])) in applied or migration["cog"] in failed_cogs:
+                continue  # later migrations for a cog may depend on one that failed
+
+            print(f"Applying migration {migration['version']} for {migration['cog']}")
+            try:
+                async with connection.transaction():
+                    for statement in migration["sql"]:
+                        await connection.execute(statement)
+                    await connection.execute("INSERT INTO schema_version (cog, version) VALUES ($1, $2)",
+                                             migration["cog"], str(migration["version"]))
+            except Exception as e:
+                print(f"{e}\nThe above occurred when trying to apply migration {migration['version']} for {migration['cog']}")
+                failed_cogs.append(migration["cog"])
+
+        for index in index_collection:
+            version = f"index:{index['name']}"
+            if (index["cog"], version) in applied:
                 continue
 
-            name = table.get("name", None)
-            fields_params = table.get("fields", None)
-            renames = table.get("migrate", {})
+            print(f"Creating index {index['name']} on {index['table']}")
+            try:
+                await connection.execute(
+                    f"CREATE {'UNIQUE ' if index['unique'] else ''}INDEX CONCURRENTLY IF NOT EXISTS {index['name']} ON {index['table']} ({', '.join(index['columns'])})")
+                await connection.execute("INSERT INTO schema_version (cog, version) VALUES ($1, $2)", index["cog"],
+                                         version)
+            except Exception as e:
+                print(f"{e}\nThe above occurred when trying to create the index {index['name']} on {index['table']}")
+                try:
+                    await connection.execute(
+                        f"DROP INDEX CONCURRENTLY IF EXISTS {index['name']}")  # a failed concurrent build leaves an invalid index behind
+                except Exception as e:
+                    print(f"{e}\nThe above occurred when trying to drop the invalid index {index['name']}, it will be retried next startup")
 
-            if type(name) is not str or type(fields_params) is not list or len(
-                    [field for field in fields_params if type(field) is not str]) > 0:
+        declared = {(index["cog"], f"index:{index['name']}") for index in index_collection}
+        for cog, version in applied:
+            if cog not in loaded_cogs or not version.startswith("index:") or (cog, version) in declared:
                 continue
 
-            field_names = []
-            field_cond = []
+            name = version[len("index:"):]
+            print(f"Dropping index {name}, which {cog} no longer declares")
+            try:
+                await connection.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+                await connection.execute("DELETE FROM schema_version WHERE cog = $1 AND version = $2", cog, version)
+            except Exception as e:
+                print(f"{e}\nThe above occurred when trying to drop the index {name}")
 
-            for field in fields_params:
-                field_names.append(field[:field.index(" ")])
-                field_cond.append(field[field.index(" ") + 1:])
 
-            available_columns = await connection.fetch(
-                f"SELECT column_name FROM information_schema.columns WHERE table_name='{name}'")
-            available_columns = [column["column_name"] for column in available_columns]
+async def migrate(pool: asyncpg.pool.Pool, table_collection: list[dict], migration_collection: list[dict],
+                  index_collection: list[dict], loaded_cogs: list[str]) -> None:
+    """
+    Brings the DB schema in line with the cog configs: creates tables, adds and renames columns, then applies
+    migrations and indexes.
 
-            for field_name in field_names:  # idea of this is to add new columns added to cog configs automatically without needing to do it manually
-                await insert_migrate_column_if_not_exists(pool, name, field_name,
-                                                          column_params=field_cond[field_names.index(field_name)],
-                                                          rename_from=renames.get(field_name, None))
+    Skipped entirely if the cog configs haven't changed since it last completed.
+    """
 
-            for rename in renames:  # this is technically undefined behaviour since ordinarily configs shouldn't be requesting renames for columns that aren't specified but we're making use of it for config ;)
-                if rename not in field_names:  # ie already done above
-                    await insert_migrate_column_if_not_exists(pool, name, rename, rename_from=renames.get(rename),
-                                                              create_if_not_exists=False)  # won't know types + handled by config anyway to save db space
+    fingerprint = schema_fingerprint(table_collection + migration_collection + index_collection)
+    async with pool.acquire() as connection:
+        if await get_fingerprint(connection, "schema") == fingerprint:
+            print("DB schema unchanged, skipping migrations")
+            return
 
-            if name != "config":
-                [print(f"INFO: Phantom DB column {column} in {name}") for column in available_columns if
-                 column not in field_names]  # don't delete in case they're still needed
+    await introduce_tables(pool, table_collection)
+    columns_applied = await insert_cog_db_columns_if_not_exists(pool, table_collection)
+    await apply_migrations(pool, migration_collection, index_collection, loaded_cogs)
+
+    async with pool.acquire() as connection:
+        pending = await connection.fetchval(
+            "SELECT COUNT(*) FROM unnest($1::text[], $2::text[]) AS wanted (cog, version) WHERE NOT EXISTS (SELECT 1 FROM schema_version s WHERE s.cog = wanted.cog AND s.version = wanted.version)",
+            [m["cog"] for m in migration_collection] + [i["cog"] for i in index_collection],
+            [str(m["version"]) for m in migration_collection] + [f"index:{i['name']}" for i in index_collection])
+        if columns_applied and not pending:  # only remember the schema as applied if everything went through
+            await set_fingerprint(connection, "schema", fingerprint)
@@ -1,7 +1,10 @@
+from abc import ABC, abstractmethod
+from collections import OrderedDict
 from datetime import timedelta
 from math import ceil
 from typing import Optional
 
+import asyncpg
 import discord
 from discord import Embed, Colour
 from discord.ext import commands
@@ -22,12 +25,99 @@ class EmbedPageButton(discord.ui.Button['EmbedPages']):
         await self.func(interaction)
 
 
+class PageSource(ABC):
+    """
+    Where EmbedPages gets its rows from. Only the page on display and its neighbours are kept, so a big table never
+    has to be held in memory all at once.
+
+    Subclasses implement `count` and `fetch_page`.
+    """
+
+    CACHED_PAGES = 3
+
+    def __init__(self) -> None:
+        self.pages = OrderedDict()  # Links page_num -> rows
+
+    @abstractmethod
+    async def count(self) -> int:
+        pass
+
+    @abstractmethod
+    async def fetch_page(self, page_num: int, page_length: int) -> list:
+        pass
+
+    async def get_page(self, page_num: int, page_length: int) -> list:
+        if page_num not in self.pages:
+            self.pages[page_num] = await self.fetch_page(page_num, page_length)
+            while len(self.pages) > self.CACHED_PAGES:
+                del self.pages[max(self.pages, key=lambda cached: abs(cached - page_num))]  # Drop the furthest page away
+        return self.pages[page_num]
+
+
+class ListPageSource(PageSource):
+    """
+    Pages over anything that can be sliced, for data that's already in memory
+    """
+
+    def __init__(self, data) -> None:
+        super().__init__()
+        self.data = data
+
+    async def count(self) -> int:
+        return len(self.data)
+
+    async def fetch_page(self, page_num: int, page_length: int) -> list:
+        return list(self.data[(page_num - 1) * page_length:page_num * page_length])
+
+
+class QueryPageSource(PageSource):
+    """
+    Pages over the rows of a query, ordered by `key`. When a neighbouring page is cached the next one is found with
+    keyset pagination (WHERE key > last key) rather than an OFFSET that has to walk every row before it.
+
+    `query` must be a SELECT with a WHERE clause and no ORDER BY, e.g. "SELECT * FROM warn WHERE guild_id = $1"
+    """
+
+    def __init__(self, pool: asyncpg.pool.Pool, query: str, *args, key: str = "id") -> None:
+        super().__init__()
+        self.pool = pool
+        self.query = query
+        self.args = args
+        self.key = key
+        self.total = None
+
+    async def count(self) -> int:
+        if self.total is None:
+            async with self.pool.acquire() as connection:
+                self.total = await connection.fetchval(f"SELECT COUNT(*) FROM ({self.query}) AS page_rows", *self.args)
+        return self.total
+
+    async def fetch_page(self, page_num: int, page_length: int) -> list:
+        n = len(self.args)
+        previous_page = self.pages.get(page_num - 1)
+        next_page = self.pages.get(page_num + 1)
+        async with self.pool.acquire() as connection:
+            if previous_page:
+                return await connection.fetch(
+                    f"{self.query} AND {self.key} > ${n + 1} ORDER BY {self.key} LIMIT ${n + 2}", *self.args,
+                    previous_page[-1][self.key], page_length)
+            if next_page:
+                rows = await connection.fetch(
+                    f"{self.query} AND {self.key} < ${n + 1} ORDER BY {self.key} DESC LIMIT ${n + 2}", *self.args,
+                    next_page[0][self.key], page_length)
+                return rows[::-1]
+            return await connection.fetch(f"{self.query} ORDER BY {self.key} LIMIT ${n + 1} OFFSET ${n + 2}",
+                                          *self.args, page_length, (page_num - 1) * page_length)
+
+
 class EmbedPages(discord.ui.View):
-    def __init__(self, page_type: int, data: list, title: str, colour: Colour, bot, initiator: discord.Member, channel: discord.TextChannel | discord.Thread, desc: str = "", thumbnail_url: str = "",
+    def __init__(self, page_type: int, data: list | dict | PageSource, title: str, colour: Colour, bot, initiator: discord.Member, channel: discord.TextChannel | discord.Thread, desc: str = "", thumbnail_url: str = "",
                  footer: str = "", icon_url: str = "", ctx: commands.Context | discord.Interaction = None) -> None:
         super().__init__(timeout=300)  # Initialise view
         self.bot = bot
-        self.data = data
+        if isinstance(data, dict):
+            data = list(data.items())
+        self.data = data if isinstance(data, PageSource) else ListPageSource(data)
         self.title = title
         self.page_type = page_type
         self.top_limit = 0
@@ -57,14 +147,12 @@ class EmbedPages(discord.ui.View):
         Changes the embed accordingly
         """
 
-        if self.page_type == PageTypes.REP:
-            self.data = [x for x in self.data if self.channel.guild.get_member(x[0]) is not None]
-            page_length = 10
-        elif self.page_type == PageTypes.ROLE_LIST:
+        if self.page_type in [PageTypes.REP, PageTypes.ROLE_LIST]:
             page_length = 10
         else:
             page_length = 5
-        self.top_limit = ceil(len(self.data) / page_length)
+        self.top_limit = ceil(await self.data.count() / page_length)
+        page_num = min(max(page_num, 1), max(self.top_limit, 1))  # page_num may come straight from the user
 
         # Clear previous data
         self.embed = Embed(title=f"{self.title} (Page {page_num}/{self.top_limit})", color=self.colour,
@@ -81,53 +169,52 @@ class EmbedPages(discord.ui.View):
 
         # Gettings the wanted data
         self.page_num = page_num
-        page_num -= 1
-        for i in range(page_length * page_num, min(page_length * page_num + page_length, len(self.data))):
+        for row in await self.data.get_page(page_num, page_length):
             # Go through each different type of page and format accordingly
             if self.page_type == PageTypes.QOTD:
-                question_id = self.data[i][0]
-                question = self.data[i][1]
-                member_id = int(self.data[i][2])
+                question_id = row[0]
+                question = row[1]
+                member_id = int(row[2])
                 user = await self.bot.fetch_user(member_id)
-                date = (self.data[i][3] + timedelta(hours=1)).strftime("%H:%M on %d/%m/%y")
+                date = (row[3] + timedelta(hours=1)).strftime("%H:%M on %d/%m/%y")
 
                 self.embed.add_field(name=f"{question}",
                                      value=f"ID **{question_id}** submitted on {date} by {user.name if user else '*MEMBER NOT FOUND*'} ({member_id})",
                                      inline=False)
 
             elif self.page_type == PageTypes.WARN:
-                staff = await self.bot.fetch_user(self.data[i][2])
-                member = await self.bot.fetch_user(self.data[i][1])
+                staff = await self.bot.fetch_user(row[2])
+                member = await self.bot.fetch_user(row[1])
 
                 if member:
-                    member_string = f"{str(member)} ({self.data[i][1]}) Reason: {self.data[i][4]}"
+                    member_string = f"{str(member)} ({row[1]}) Reason: {row[4]}"
                 else:
-                    member_string = f"DELETED USER ({self.data[i][1]}) Reason: {self.data[i][4]}"
+                    member_string = f"DELETED USER ({row[1]}) Reason: {row[4]}"
 
                 if staff:
-                    staff_string = f"{str(staff)} ({self.data[i][2]})"
+                    staff_string = f"{str(staff)} ({row[2]})"
                 else:
-                    staff_string = f"DELETED USER ({self.data[i][2]})"
+                    staff_string = f"DELETED USER ({row[2]})"
 
-                self.embed.add_field(name=f"**{self.data[i][0]}** : {member_string}",
-                                     value=f"{self.data[i][3].strftime('On %d/%m/%Y at %I:%M %p')} by {staff_string}",
+                self.embed.add_field(name=f"**{row[0]}** : {member_string}",
+                                     value=f"{row[3].strftime('On %d/%m/%Y at %I:%M %p')} by {staff_string}",
                                      inline=False)
 
             elif self.page_type == PageTypes.REP:
-                member = self.channel.guild.get_member(self.data[i][0])
-                self.embed.add_field(name=f"{member.display_name}", value=f"{self.data[i][1]}", inline=False)
+                member = self.channel.guild.get_member(row[0])
+                self.embed.add_field(name=member.display_name if member else f"*MEMBER NOT FOUND* ({row[0]})",
+                                     value=f"{row[1]}", inline=False)
 
             elif self.page_type == PageTypes.CONFIG:
-                config_key = list(self.data.keys())[i]  # Change the index into the key
-                config_option = self.data[config_key]  # Get the current value list from the key
+                config_key, config_option = row  # The key and its current value list
                 name = f"• {str(config_key)} ({config_option[1]})"  # Config name that appears on the embed
                 self.embed.add_field(name=name, value=config_option[2], inline=False)
 
             elif self.page_type == PageTypes.ROLE_LIST:
-                self.embed.add_field(name=self.data[i].name, value=self.data[i].mention, inline=False)
+                self.embed.add_field(name=row.name, value=row.mention, inline=False)
 
             elif self.page_type == PageTypes.STARBOARD_LIST:
-                starboard = self.data[i]
+                starboard = row
                 channel = self.bot.get_channel(starboard.channel.id)
                 custom_emoji = self.bot.get_emoji(starboard.emoji_id) if starboard.emoji_id else None
                 colour = starboard.embed_colour if starboard.embed_colour else "#" + "".join([str(hex(component)).replace("0x", "").upper() for component in self.bot.GOLDEN_YELLOW.to_rgb()])
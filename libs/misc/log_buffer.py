@@ -0,0 +1,65 @@
+import asyncio
+
+import discord
+
+
+class LogBuffer:
+    """
+    Collects the embeds going to each log channel and sends them in as few messages as possible. A message holds up to
+    10 embeds and 6000 characters, and a channel's embeds are sent once a message is full or FLUSH_DELAY seconds after
+    the first one was queued.
+    """
+
+    FLUSH_DELAY = 1
+    MAX_EMBEDS = 10
+    MAX_CHARACTERS = 6000
+
+    def __init__(self, bot) -> None:
+        self.bot = bot
+        self.buffers = {}  # Links channel_id -> embeds waiting to be sent
+        self.channels = {}  # Links channel_id -> channel
+        self.flush_tasks = {}  # Links channel_id -> task waiting FLUSH_DELAY to send the channel's embeds
+        self.running_flushes = set()  # Every delayed flush that hasn't finished, including ones that are sending
+        self.locks = {}  # Links channel_id -> lock held while sending, so messages go out in the order they were queued
+
+    async def send(self, channel: discord.TextChannel | discord.Thread, embed: discord.Embed) -> None:
+        buffer = self.buffers.get(channel.id, [])
+        if buffer and sum(len(queued) for queued in buffer) + len(embed) > self.MAX_CHARACTERS:
+            await self.flush(channel)
+
+        self.buffers.setdefault(channel.id, []).append(embed)
+        self.channels[channel.id] = channel
+        if len(self.buffers[channel.id]) >= self.MAX_EMBEDS:
+            await self.flush(channel)
+        elif channel.id not in self.flush_tasks:
+            task = self.bot.loop.create_task(self.delayed_flush(channel))
+            self.flush_tasks[channel.id] = task
+            self.running_flushes.add(task)
+            task.add_done_callback(self.running_flushes.discard)
+
+    async def delayed_flush(self, channel: discord.TextChannel | discord.Thread) -> None:
+        await asyncio.sleep(self.FLUSH_DELAY)
+        self.flush_tasks.pop(channel.id, None)  # Can't be cancelled from here on, later flushes wait for the lock instead
+        try:
+            await self.flush(channel)
+        except discord.HTTPException as e:
+            print(f"{type(e).__name__}: {e}")
+
+    async def flush(self, channel: discord.TextChannel | discord.Thread) -> None:
+        """
+        Sends the channel's queued embeds. A delayed flush that is still waiting is cancelled, as its embeds go out
+        here, and one that is already sending is waited for so the messages stay in order.
+        """
+
+        task = self.flush_tasks.pop(channel.id, None)
+        if task and task is not asyncio.current_task():
+            task.cancel()
+
+        async with self.locks.setdefault(channel.id, asyncio.Lock()):
+            embeds = self.buffers.pop(channel.id, [])
+            if embeds:
+                await channel.send(embeds=embeds)
+
+    async def flush_all(self) -> None:
+        for channel_id in list(self.buffers):
+            await self.flush(self.channels[channel_id])
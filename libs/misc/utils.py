@@ -46,16 +46,19 @@ CODE_URL = "https://github.com/adampy/adambot"
 async def send_image_file(ctx: commands.Context | discord.Interaction, fig,
                           channel: discord.TextChannel | discord.Thread, filename: str, extension: str = "png") -> None:
     """
-    Send data to a channel with filename `filename`
+    Send data to a channel with filename `filename`. `fig` is either a figure or an image that has already been encoded
     """
 
     ctx_type = get_context_type(ctx)
     if ctx_type is ContextTypes.Unknown:
         return
 
-    buf = BytesIO()
-    fig.savefig(buf)
-    buf.seek(0)
+    if isinstance(fig, bytes):
+        buf = BytesIO(fig)
+    else:
+        buf = BytesIO()
+        fig.savefig(buf)
+        buf.seek(0)
     file = File(buf, filename=f"{filename}.{extension}")
 
     if ctx_type == ContextTypes.Context:
@@ -88,8 +91,8 @@ async def send_text_file(ctx: commands.Context | discord.Interaction, text: str,
 async def get_spaced_member(ctx: commands.Context, bot, *, args: str) -> Optional[discord.Member]:
     """
     Moves hell on Earth to get a guild member object from a given string
-    Makes use of last_active, a priority temp list that stores member objects of
-    the most recently active members
+    Makes use of last_active, which holds the ids of the guild's most recently active
+    members, checking them most recent first
     """
 
     possible_mention = args.split(" ")[0]
@@ -102,7 +105,8 @@ async def get_spaced_member(ctx: commands.Context, bot, *, args: str) -> Optiona
             user = await commands.MemberConverter().convert(ctx, args)
         except commands.errors.MemberNotFound:
             # for the love of god
-            lists = [bot.last_active.get(ctx.guild.id, []), ctx.guild.members]
+            recent = [ctx.guild.get_member(member_id) for member_id in reversed(bot.last_active.get(ctx.guild.id, {}))]
+            lists = [[member for member in recent if member], ctx.guild.members]
             attribs = ["display_name", "name"]
             for list_ in lists:
                 for attrib in attribs:
@@ -0,0 +1,58 @@
+"""
+Compares the old per-phrase filter loop with the compiled FilterMatcher.
+
+Run from the project root with `python -m scripts.benchmarks.filter_matcher`
+"""
+
+import random
+import string
+import timeit
+
+from cogs.guild.guild_features.moderation.filter_matcher import FilterMatcher
+
+PHRASE_COUNTS = [10, 1000, 10000]
+MESSAGES = 200
+
+
+def loop_match(filters: dict, content: str) -> list[str]:
+    """
+    The filter as it was before FilterMatcher
+    """
+
+    msg = content.lower()
+    for ignore in filters["ignored"]:
+        msg = msg.replace(ignore.lower(), "")
+
+    return [phrase.lower() for phrase in filters["filtered"] if phrase.lower() in msg]
+
+
+def random_word(rng: random.Random, min_length: int = 3, max_length: int = 10) -> str:
+    return "".join(rng.choices(string.ascii_lowercase, k=rng.randint(min_length, max_length)))
+
+
+def make_case(rng: random.Random, phrase_count: int) -> tuple[dict, list[str]]:
+    filtered = [random_word(rng, 5) for _ in range(phrase_count)]
+    ignored = [random_word(rng, 2) + phrase + random_word(rng, 2) for phrase in rng.sample(filtered, max(1, phrase_count // 10))]
+    messages = []
+    for _ in range(MESSAGES):
+        words = [random_word(rng) for _ in range(rng.randint(5, 40))]
+        if rng.random() < 0.1:
+            words.insert(rng.randrange(len(words)), rng.choice(filtered + ignored))
+        messages.append(" ".join(words))
+    return {"filtered": filtered, "ignored": ignored}, messages
+
+
+if __name__ == "__main__":
+    rng = random.Random(0)
+    print(f"{'phrases':>8} | {'loop (ms/msg)':>14} | {'matcher (ms/msg)':>17} | {'build (ms)':>10} | speedup")
+    for count in PHRASE_COUNTS:
+        filters, messages = make_case(rng, count)
+
+        build = timeit.timeit(lambda: FilterMatcher(filters["filtered"], filters["ignored"]), number=1)
+        matcher = FilterMatcher(filters["filtered"], filters["ignored"])
+
+        loop_time = timeit.timeit(lambda: [loop_match(filters, message) for message in messages], number=1)
+        matcher_time = timeit.timeit(lambda: [matcher.match(message) for message in messages], number=1)
+
+        print(f"{count:>8} | {loop_time / MESSAGES * 1000:>14.4f} | {matcher_time / MESSAGES * 1000:>17.4f} | "
+              f"{build * 1000:>10.1f} | {loop_time / matcher_time:.1f}x")
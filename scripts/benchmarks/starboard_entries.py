@@ -0,0 +1,58 @@
+"""
+Compares finding a starboard entry by scanning a list of entries with the message_id -> Entry dict that
+StarboardContainer keeps.
+
+Run from the project root with `python -m scripts.benchmarks.starboard_entries`
+"""
+
+import asyncio
+import random
+import time
+
+from cogs.guild.guild_features.starboard.starboard_container import StarboardContainer
+
+ENTRIES = 100000
+LOOKUPS = 1000
+
+
+def make_entry(message_id: int) -> StarboardContainer.Entry:
+    return StarboardContainer.Entry({"message_id": message_id, "bot_message_id": message_id,
+                                     "starboard_channel_id": 0}, None)
+
+
+async def list_get_entry(entries: list, message_id: int) -> StarboardContainer.Entry | None:
+    """
+    `try_get_entry` as it was when entries were kept in a list
+    """
+
+    for entry in entries:
+        if entry.message_id == message_id:
+            return entry
+    return None
+
+
+async def main() -> None:
+    rng = random.Random(0)
+    entries = [make_entry(message_id) for message_id in range(ENTRIES)]
+    starboard = StarboardContainer.__new__(StarboardContainer)  # skips the channel lookup, which needs a bot
+    starboard.entries = {entry.message_id: entry for entry in entries}
+    message_ids = [rng.randrange(ENTRIES * 2) for _ in range(LOOKUPS)]  # about half of these miss
+
+    start = time.perf_counter()
+    for message_id in message_ids:
+        await list_get_entry(entries, message_id)
+    list_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for message_id in message_ids:
+        await starboard.try_get_entry(message_id)
+    dict_time = time.perf_counter() - start
+
+    print(f"{ENTRIES} entries, {LOOKUPS} lookups")
+    print(f"list (ms/lookup): {list_time / LOOKUPS * 1000:.4f}")
+    print(f"dict (ms/lookup): {dict_time / LOOKUPS * 1000:.6f}")
+    print(f"speedup: {list_time / dict_time:.0f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
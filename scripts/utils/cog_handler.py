@@ -17,6 +17,8 @@ class CogHandler:
 
         self.intent_list = []
         self.db_tables = []
+        self.db_migrations = []
+        self.db_indexes = []
 
     def preload_cog(self, key: str, filename: str, base="cogs") -> list[bool, Exception]:
         loader = None
@@ -57,6 +59,19 @@ class CogHandler:
                             self.db_tables.append(
                                 {"name": key, "fields": fields, "other_params": other_params, "migrate": migrate})
 
+                        indexes = table_schema.get("indexes", {})
+                        for index_name in indexes:
+                            index = indexes.get(index_name)
+                            if type(index.get("columns", None)) is list:
+                                self.db_indexes.append({"cog": final, "name": index_name, "table": key,
+                                                        "columns": index["columns"],
+                                                        "unique": index.get("unique", False)})
+
+                migrations = cog_config.get("migrations", [])
+                for migration in migrations:
+                    if type(migration.get("version", None)) is int and type(migration.get("sql", None)) is list:
+                        self.db_migrations.append({"cog": final, "version": migration["version"], "sql": migration["sql"]})
+
                 config_keys = cog_config.get("config_keys", {})
                 if config_keys:
                     for key in config_keys: